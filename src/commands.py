@@ -0,0 +1,123 @@
+import click
+from flask.cli import with_appcontext
+from src.database import db
+from src.models.family_tree import bump_tree_version
+from src.services.gedcom import import_gedcom
+from src.services.ancestry import rebuild_ancestry
+from src.services.dedup import DEDUP_MIN_SCORE, find_duplicates
+from src.services.person_search import rebuild_search_index
+from src.services.places import load_gazetteer, normalize_person_places
+from src.services.ancestor_matching import match_user_ancestors
+from src.services.family_stats import reconcile_family_stats
+from src.services.forum_counts import reconcile_forum_counts
+from src.services.forum_search import rebuild_forum_search_index
+
+@click.command('import-gedcom')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_gedcom_command(path):
+    """Importa um arquivo GEDCOM para a árvore genealógica"""
+    with open(path, encoding='utf-8-sig', errors='replace') as gedcom_file:
+        result = import_gedcom(gedcom_file)
+    click.echo(
+        f"Imported {result['persons']} persons and {result['families']} families "
+        f"in {result['elapsed_seconds']}s ({result['persons_per_second']} persons/s)"
+    )
+
+@click.command('rebuild-ancestry')
+@with_appcontext
+def rebuild_ancestry_command():
+    """Reconstrói person_ancestry e as colunas generation/descendant_count a partir de person"""
+    rows = rebuild_ancestry()
+    reconcile_family_stats()
+    db.session.commit()
+    click.echo(f'Rebuilt person_ancestry with {rows} rows')
+
+@click.command('find-duplicates')
+@click.option('--workers', type=int, default=None, help='Processos do pool (padrão: número de CPUs)')
+@click.option('--min-score', type=float, default=DEDUP_MIN_SCORE, show_default=True)
+@with_appcontext
+def find_duplicates_command(workers, min_score):
+    """Procura pessoas duplicadas por blocos fonéticos e grava os candidatos"""
+    count = find_duplicates(workers=workers, min_score=min_score)
+    db.session.commit()
+    click.echo(f'Found {count} duplicate candidates')
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Preenche name_normalized e reconstrói o índice de busca de nomes"""
+    filled = rebuild_search_index()
+    db.session.commit()
+    click.echo(f'Rebuilt person_name_fts ({filled} names normalized)')
+
+@click.command('normalize-places')
+@with_appcontext
+def normalize_places_command():
+    """Vincula birth_place/death_place de todas as pessoas à tabela place"""
+    updated = normalize_person_places()
+    reconcile_family_stats()
+    db.session.commit()
+    click.echo(f'Linked places for {updated} persons')
+
+@click.command('load-gazetteer')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def load_gazetteer_command(path):
+    """Carrega nomes canônicos e coordenadas de um arquivo de cidades do GeoNames"""
+    with open(path, encoding='utf-8') as gazetteer_file:
+        located = load_gazetteer(gazetteer_file)
+    if located:
+        # Nomes canônicos aparecem em top_birth_places de /statistics
+        bump_tree_version()
+        reconcile_family_stats()
+    db.session.commit()
+    click.echo(f'Located {located} places')
+
+@click.command('match-user-ancestors')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Restringe a estes usuários (padrão: todos)')
+@with_appcontext
+def match_user_ancestors_command(user_ids):
+    """Sugere conexões casando os ancestrais declarados pelos usuários com pessoas da árvore"""
+    result = match_user_ancestors(user_ids or None)
+    db.session.commit()
+    click.echo(
+        f"Proposed {result['suggestions']} connections for {result['users']} users "
+        f"({result['persons_indexed']} persons indexed)"
+    )
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Recalcula do zero o snapshot family_stats servido por /statistics"""
+    stats = reconcile_family_stats()
+    db.session.commit()
+    click.echo(f'Reconciled family_stats ({stats.total_persons} persons, {stats.generations} generations)')
+
+@click.command('reconcile-forum-counts')
+@with_appcontext
+def reconcile_forum_counts_command():
+    """Recalcula os contadores de tópicos e postagens das categorias e tópicos do fórum"""
+    result = reconcile_forum_counts()
+    db.session.commit()
+    click.echo(f"Fixed counters of {result['categories']} categories and {result['topics']} topics")
+
+@click.command('rebuild-forum-search-index')
+@with_appcontext
+def rebuild_forum_search_index_command():
+    """Reconstrói os índices de texto completo de tópicos e postagens do fórum"""
+    rebuild_forum_search_index()
+    db.session.commit()
+    click.echo('Rebuilt forum_topic_fts and forum_post_fts')
+
+def register_commands(app):
+    app.cli.add_command(import_gedcom_command)
+    app.cli.add_command(rebuild_ancestry_command)
+    app.cli.add_command(find_duplicates_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(normalize_places_command)
+    app.cli.add_command(load_gazetteer_command)
+    app.cli.add_command(match_user_ancestors_command)
+    app.cli.add_command(reconcile_stats_command)
+    app.cli.add_command(reconcile_forum_counts_command)
+    app.cli.add_command(rebuild_forum_search_index_command)
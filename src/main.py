@@ -12,9 +12,20 @@ from src.routes.genealogy import genealogy_bp
 from src.routes.social import social_bp
 from src.routes.media import media_bp
 from src.routes.forum import forum_bp
+from src.commands import register_commands
+from src.migrations import add_missing_columns, backfill_life_dates
+from src.services.ancestry import rebuild_ancestry
+from src.services.person_search import ensure_search_index
+from src.services.forum_search import ensure_forum_search_index
+from src.services.places import normalize_person_places
+from src.services.family_trees import rebuild_tree_membership
+from src.services.forum_counts import reconcile_forum_counts
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# True conta no máximo uma visualização de cada tópico por sessão; desligado por padrão,
+# cada implantação pode ativá-lo
+app.config['FORUM_VIEW_DEDUP'] = False
 
 # Configure CORS
 CORS(app)
@@ -35,12 +46,34 @@ app.register_blueprint(social_bp, url_prefix='/api')
 app.register_blueprint(media_bp, url_prefix='/api')
 app.register_blueprint(forum_bp, url_prefix='/api')
 
+# CLI commands (flask --app src.main <command>)
+register_commands(app)
+
 # uncomment if you need to use database
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    added_columns = add_missing_columns()
+    if {('person', 'generation'), ('person', 'descendant_count')} & added_columns:
+        # Banco anterior às colunas de linhagem: preenche person_ancestry, generation e descendant_count
+        rebuild_ancestry()
+        db.session.commit()
+    if ('person', 'birth_year') in added_columns:
+        backfill_life_dates()
+        db.session.commit()
+    if ('person', 'birth_place_id') in added_columns:
+        normalize_person_places()
+        db.session.commit()
+    if ('person', 'tree_id') in added_columns:
+        rebuild_tree_membership()
+        db.session.commit()
+    if ('forum_category', 'topic_count') in added_columns:
+        reconcile_forum_counts()
+        db.session.commit()
+    ensure_search_index()
+    ensure_forum_search_index()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,84 @@
+"""Atualização leve do esquema para bancos criados por versões anteriores.
+
+``db.create_all()`` só cria tabelas que não existem; as colunas e os índices
+listados em ``MIGRATED_COLUMNS`` e ``MIGRATED_INDEXES`` são adicionados a
+tabelas existentes com ALTER TABLE ADD COLUMN / CREATE INDEX, que o SQLite
+executa sem reescrever a tabela. Nenhuma outra tabela ou coluna é alterada.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+from src.database import db
+from src.models.person import Person
+from src.services.dates import life_date_columns
+
+# Colunas que os modelos ganharam em tabelas que já existiam
+MIGRATED_COLUMNS = {
+    'person': (
+        'name_normalized', 'birth_place_id', 'death_place_id', 'tree_id',
+        'birth_year', 'birth_month', 'birth_day', 'birth_precision',
+        'death_year', 'death_month', 'death_day', 'death_precision',
+        'generation', 'descendant_count', 'row_version',
+    ),
+    'forum_category': ('topic_count', 'post_count'),
+}
+MIGRATED_INDEXES = {
+    'person': (
+        'ix_person_name_normalized', 'ix_person_birth_place_id', 'ix_person_death_place_id',
+        'ix_person_father_id', 'ix_person_mother_id', 'ix_person_tree_id',
+        'ix_person_birth', 'ix_person_death', 'ix_person_generation',
+        'ix_person_descendant_count', 'ix_person_generation_descendants',
+    ),
+    'forum_topic': ('ix_forum_topic_category_activity', 'ix_forum_topic_activity'),
+    'forum_post': ('ix_forum_post_topic_created',),
+}
+
+def _column_ddl(column):
+    ddl = f'{column.name} {column.type.compile(dialect=db.engine.dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        ddl += f' DEFAULT {default!r}'
+    if not column.nullable and default is not None:
+        ddl += ' NOT NULL'
+    return ddl
+
+def add_missing_columns():
+    """Adiciona as colunas e os índices migrados que faltam no banco; retorna {(tabela, coluna)} adicionadas"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    tables = db.metadata.tables
+    added = set()
+    with db.engine.begin() as connection:
+        for table_name in MIGRATED_COLUMNS.keys() | MIGRATED_INDEXES.keys():
+            if table_name not in existing_tables:
+                continue
+            table = tables[table_name]
+            columns = {column['name'] for column in inspector.get_columns(table_name)}
+            for column_name in MIGRATED_COLUMNS.get(table_name, ()):
+                if column_name not in columns:
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {table_name} ADD COLUMN {_column_ddl(table.columns[column_name])}'
+                    )
+                    added.add((table_name, column_name))
+            indexes = {index['name'] for index in inspector.get_indexes(table_name)}
+            model_indexes = {index.name: index for index in table.indexes}
+            for index_name in MIGRATED_INDEXES.get(table_name, ()):
+                if index_name not in indexes:
+                    connection.execute(CreateIndex(model_indexes[index_name]))
+    return added
+
+def backfill_life_dates(batch_size=5000):
+    """Preenche as colunas de data interpretada de Person a partir de birth_date/death_date"""
+    person_table = Person.__table__
+    columns = [*life_date_columns('birth', None), *life_date_columns('death', None)]
+    statement = person_table.update().where(person_table.c.id == db.bindparam('person_id')).values(
+        {column: db.bindparam(column) for column in columns}
+    )
+    rows = db.session.execute(
+        db.select(person_table.c.id, person_table.c.birth_date, person_table.c.death_date)
+    ).all()
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(statement, [
+            dict(person_id=person_id, **life_date_columns('birth', birth_date), **life_date_columns('death', death_date))
+            for person_id, birth_date, death_date in rows[start:start + batch_size]
+        ])
+    return len(rows)
@@ -9,10 +9,19 @@ class FamilyTree(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship to root person
-    root_person = db.relationship('Person', backref='family_trees_as_root')
+    root_person = db.relationship('Person', foreign_keys=[root_person_id], backref='family_trees_as_root')
     
     def __repr__(self):
         return f'<FamilyTree {self.name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'root_person_id': self.root_person_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
 
 class UserPersonConnection(db.Model):
     """Tabela para conectar usuários registrados com pessoas na árvore genealógica"""
@@ -30,3 +39,101 @@ class UserPersonConnection(db.Model):
     def __repr__(self):
         return f'<UserPersonConnection User:{self.user_id} Person:{self.person_id}>'
 
+class ConnectionSuggestion(db.Model):
+    """Conexão usuário-pessoa proposta pelo matcher de ancestrais declarados (src.services.ancestor_matching)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
+    relationship_type = db.Column(db.String(50), nullable=False)  # 'father', 'grandmother_maternal', etc.
+    confidence = db.Column(db.Float, nullable=False)
+    dismissed = db.Column(db.Boolean, default=False)  # recusada pelo usuário: não é proposta de novo
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    person = db.relationship('Person')
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'relationship_type', 'person_id', name='unique_connection_suggestion'),)
+    
+    def __repr__(self):
+        return f'<ConnectionSuggestion User:{self.user_id} Person:{self.person_id} ({self.confidence})>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'person_id': self.person_id,
+            'relationship_type': self.relationship_type,
+            'confidence': self.confidence,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class TreeVersion(db.Model):
+    """Contador global incrementado a cada escrita em Person/FamilyTree.
+    
+    Permite que cada worker descubra com uma leitura barata se os índices
+    mantidos em memória estão desatualizados.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TreeVersion {self.version}>'
+
+class FamilyStats(db.Model):
+    """Snapshot das estatísticas da família (linha única, id=1).
+    
+    Atualizado por deltas a cada escrita em Person (src.services.family_stats) e
+    reconciliado periodicamente por ``flask reconcile-stats``.
+    """
+    __tablename__ = 'family_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    total_persons = db.Column(db.Integer, nullable=False, default=0)
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    generations = db.Column(db.Integer, nullable=False, default=0)
+    largest_branch_id = db.Column(db.Integer, nullable=True)
+    largest_branch_descendant_count = db.Column(db.Integer, nullable=True)
+    by_gender = db.Column(db.JSON, nullable=False, default=dict)         # {'M': n, 'F': n, 'unknown': n}
+    by_century = db.Column(db.JSON, nullable=False, default=dict)        # {'1800': n, ..., 'unknown': n}
+    by_birth_place = db.Column(db.JSON, nullable=False, default=dict)    # {place_id: n}
+    top_birth_places = db.Column(db.JSON, nullable=False, default=list)  # [{'id', 'name', 'count'}]
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+    
+    # O nome é lido na hora: renomear a raiz não altera a linhagem nem o snapshot
+    largest_branch = db.relationship(
+        'Person', primaryjoin='FamilyStats.largest_branch_id == Person.id',
+        foreign_keys=[largest_branch_id], viewonly=True
+    )
+    
+    def __repr__(self):
+        return f'<FamilyStats {self.total_persons} persons>'
+    
+    def to_dict(self):
+        return {
+            'total_persons': self.total_persons,
+            'total_users': self.total_users,
+            'generations': self.generations,
+            'largest_branch': {
+                'id': self.largest_branch_id,
+                'name': self.largest_branch.name if self.largest_branch else None,
+                'descendant_count': self.largest_branch_descendant_count
+            } if self.largest_branch_id else None,
+            'by_gender': self.by_gender,
+            'by_century': self.by_century,
+            'top_birth_places': self.top_birth_places,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'reconciled_at': self.reconciled_at.isoformat() if self.reconciled_at else None
+        }
+
+def current_tree_version():
+    """Retorna a versão atual da árvore (0 se nunca houve escrita)"""
+    version = db.session.query(TreeVersion.version).filter_by(id=1).scalar()
+    return version or 0
+
+def bump_tree_version():
+    """Incrementa a versão da árvore dentro da transação corrente e retorna o novo valor"""
+    updated = TreeVersion.query.filter_by(id=1).update(
+        {TreeVersion.version: TreeVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(TreeVersion(id=1, version=1))
+        db.session.flush()
+    return current_tree_version()
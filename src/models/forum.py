@@ -11,6 +11,11 @@ class ForumCategory(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Contadores desnormalizados, atualizados pelas rotas de escrita do fórum
+    # (reconcile-forum-counts recalcula a partir das tabelas)
+    topic_count = db.Column(db.Integer, nullable=False, default=0)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+    
     def __repr__(self):
         return f'<ForumCategory {self.name}>'
     
@@ -23,8 +28,8 @@ class ForumCategory(db.Model):
             'icon': self.icon,
             'color': self.color,
             'is_active': self.is_active,
-            'topic_count': ForumTopic.query.filter_by(category_id=self.id).count(),
-            'post_count': db.session.query(ForumPost).join(ForumTopic).filter(ForumTopic.category_id == self.id).count()
+            'topic_count': self.topic_count,
+            'post_count': self.post_count
         }
 
 class ForumTopic(db.Model):
@@ -46,6 +51,13 @@ class ForumTopic(db.Model):
     user = db.relationship('User', foreign_keys=[user_id], backref='forum_topics')
     last_post_user = db.relationship('User', foreign_keys=[last_post_user_id])
     
+    # Listagem paginada por chave (is_pinned DESC, last_post_at DESC, id DESC):
+    # o SQLite percorre o índice de trás para frente, sem ordenar em memória
+    __table_args__ = (
+        db.Index('ix_forum_topic_category_activity', 'category_id', 'is_pinned', 'last_post_at', 'id'),
+        db.Index('ix_forum_topic_activity', 'is_pinned', 'last_post_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<ForumTopic {self.title}>'
     
@@ -79,10 +91,16 @@ class ForumPost(db.Model):
     topic = db.relationship('ForumTopic', backref='posts')
     user = db.relationship('User', backref='forum_posts')
     
+    # Páginas do tópico e última postagem por busca no índice
+    __table_args__ = (
+        db.Index('ix_forum_post_topic_created', 'topic_id', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<ForumPost {self.id}>'
     
-    def to_dict(self):
+    def to_dict(self, user_name=None):
+        # user_name evita a carga preguiçosa de self.user quando os autores vêm em lote
         return {
             'id': self.id,
             'topic_id': self.topic_id,
@@ -91,7 +109,7 @@ class ForumPost(db.Model):
             'is_edited': self.is_edited,
             'edited_at': self.edited_at.isoformat() if self.edited_at else None,
             'created_at': self.created_at.isoformat(),
-            'user_name': self.user.name
+            'user_name': user_name if user_name is not None else self.user.name
         }
 
 class GuestbookEntry(db.Model):
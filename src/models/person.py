@@ -1,25 +1,70 @@
 from src.database import db
 from datetime import datetime
+from sqlalchemy.orm import validates
+from src.services.names import normalize_name
+from src.services.dates import life_date_columns
 
 class Person(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    name_normalized = db.Column(db.String(100), nullable=True, index=True)  # sem acentos, para a busca
     birth_date = db.Column(db.String(10), nullable=True)
     birth_place = db.Column(db.String(200), nullable=True)
     death_date = db.Column(db.String(10), nullable=True)
     death_place = db.Column(db.String(200), nullable=True)
+    birth_place_id = db.Column(db.Integer, db.ForeignKey('place.id'), nullable=True, index=True)
+    death_place_id = db.Column(db.Integer, db.ForeignKey('place.id'), nullable=True, index=True)
     gender = db.Column(db.String(1), nullable=True)  # M or F
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    father_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True)
-    mother_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True)
+    father_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True, index=True)
+    mother_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True, index=True)
+    
+    # Árvore de família à qual a pessoa pertence, calculada a partir da raiz (src.services.family_trees)
+    tree_id = db.Column(db.Integer, db.ForeignKey('family_tree.id', use_alter=True), nullable=True, index=True)
+    
+    # Datas interpretadas (src.services.dates), para filtros e ordenação no banco
+    birth_year = db.Column(db.Integer, nullable=True)
+    birth_month = db.Column(db.Integer, nullable=True)
+    birth_day = db.Column(db.Integer, nullable=True)
+    birth_precision = db.Column(db.String(12), nullable=True)  # day, month, year ou approximate
+    death_year = db.Column(db.Integer, nullable=True)
+    death_month = db.Column(db.Integer, nullable=True)
+    death_day = db.Column(db.Integer, nullable=True)
+    death_precision = db.Column(db.String(12), nullable=True)
+    
+    # Materialized lineage columns, kept up to date by src.services.ancestry
+    generation = db.Column(db.Integer, nullable=True, index=True)  # 0 = sem pais cadastrados
+    descendant_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    
+    # Incrementada a cada alteração do que to_dict devolve (ETag de /person/<id>).
+    # Escritas core que mexem em person precisam incrementá-la também.
+    row_version = db.Column(db.Integer, nullable=False, default=1)
     
     # Self-referential relationships
     father = db.relationship('Person', remote_side=[id], foreign_keys=[father_id], backref='children_as_father')
     mother = db.relationship('Person', remote_side=[id], foreign_keys=[mother_id], backref='children_as_mother')
     
+    __table_args__ = (
+        db.Index('ix_person_birth', 'birth_year', 'birth_month', 'birth_day'),
+        db.Index('ix_person_death', 'death_year', 'death_month', 'death_day'),
+        # Maior ramo (raiz com mais descendentes) direto do índice, para family_stats
+        db.Index('ix_person_generation_descendants', 'generation', 'descendant_count'),
+    )
+    
+    @validates('name')
+    def _normalize_name(self, key, value):
+        self.name_normalized = normalize_name(value)
+        return value
+    
+    @validates('birth_date', 'death_date')
+    def _parse_life_date(self, key, value):
+        for column, parsed in life_date_columns(key[:-len('_date')], value).items():
+            setattr(self, column, parsed)
+        return value
+    
     def __repr__(self):
         return f'<Person {self.name}>'
     
@@ -31,9 +76,74 @@ class Person(db.Model):
             'birth_place': self.birth_place,
             'death_date': self.death_date,
             'death_place': self.death_place,
+            'birth_place_id': self.birth_place_id,
+            'death_place_id': self.death_place_id,
             'gender': self.gender,
             'notes': self.notes,
             'father_id': self.father_id,
-            'mother_id': self.mother_id
+            'mother_id': self.mother_id,
+            'tree_id': self.tree_id,
+            'generation': self.generation,
+            'descendant_count': self.descendant_count
         }
+    
+    @classmethod
+    def dict_select(cls):
+        """SELECT core com as mesmas colunas de to_dict, sem passar pelo identity map do ORM"""
+        return db.select(
+            cls.id, cls.name, cls.birth_date, cls.birth_place, cls.death_date,
+            cls.death_place, cls.birth_place_id, cls.death_place_id, cls.gender, cls.notes,
+            cls.father_id, cls.mother_id, cls.tree_id, cls.generation, cls.descendant_count
+        )
+
+@db.event.listens_for(Person, 'before_update')
+def _bump_row_version(mapper, connection, target):
+    # Incremento em SQL: não regride se um UPDATE core já incrementou na mesma transação
+    if db.session.is_modified(target, include_collections=False):
+        target.row_version = Person.row_version + 1
+
+class PersonAncestry(db.Model):
+    """Tabela de fechamento da árvore: uma linha por par (ancestral, descendente).
+    
+    ``distance`` é o menor número de gerações entre os dois. Mantida por
+    ``src.services.ancestry`` a cada alteração de father_id/mother_id.
+    """
+    __tablename__ = 'person_ancestry'
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    distance = db.Column(db.Integer, nullable=False)
+    
+    # A chave primária (ancestor_id, descendant_id) atende as buscas por descendentes;
+    # o índice secundário atende as buscas por ancestrais. WITHOUT ROWID evita uma
+    # terceira árvore B só para o rowid.
+    __table_args__ = (
+        db.Index('ix_person_ancestry_descendant', 'descendant_id', 'distance'),
+        {'sqlite_with_rowid': False},
+    )
+    
+    def __repr__(self):
+        return f'<PersonAncestry {self.ancestor_id}->{self.descendant_id} ({self.distance})>'
 
+class DuplicateCandidate(db.Model):
+    """Par de pessoas possivelmente duplicadas, gerado pelo job de deduplicação"""
+    id = db.Column(db.Integer, primary_key=True)
+    person_a_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
+    person_b_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False, index=True)
+    block_key = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('person_a_id', 'person_b_id', name='unique_duplicate_pair'),)
+    
+    def __repr__(self):
+        return f'<DuplicateCandidate {self.person_a_id}~{self.person_b_id} ({self.score:.2f})>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'person_a_id': self.person_a_id,
+            'person_b_id': self.person_b_id,
+            'score': self.score,
+            'block_key': self.block_key,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,30 @@
+from src.database import db
+from datetime import datetime
+
+class Place(db.Model):
+    """Local canônico referenciado por Person.birth_place_id/death_place_id.
+    
+    ``key`` é o nome da localidade normalizado, com o país quando conhecido
+    (src.services.places.parse_place): "Treviso, Itália" e "TREVISO - IT" viram
+    o mesmo lugar, "Treviso, Brasil" e "Treviso" sem país são outros.
+    Coordenadas e país vêm do gazetteer, quando carregado.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(200), nullable=False, unique=True)
+    name = db.Column(db.String(200), nullable=False)
+    country_code = db.Column(db.String(2), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Place {self.name}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'country_code': self.country_code,
+            'latitude': self.latitude,
+            'longitude': self.longitude
+        }
@@ -1,11 +1,24 @@
-from flask import Blueprint, request, jsonify
+import base64
+import binascii
+import json
+from flask import Blueprint, current_app, request, jsonify, session
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from src.models.forum import ForumCategory, ForumTopic, ForumPost, GuestbookEntry
+from src.services.forum_views import pending_views, record_view
+from src.services.forum_threads import (
+    DEFAULT_POSTS_PAGE_SIZE, MAX_POSTS_PAGE_SIZE, all_posts, count_posts, page_count, posts_after, posts_page, posts_to_dicts
+)
+from src.services.forum_search import SEARCH_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, search_forum as search_forum_index
 from src.database import db
 from datetime import datetime
 
 forum_bp = Blueprint('forum_bp', __name__)
 
+# Paginação da lista de tópicos
+DEFAULT_TOPICS_PAGE_SIZE = 20
+MAX_TOPICS_PAGE_SIZE = 100
+
 # Forum Category routes
 @forum_bp.route('/forum/categories', methods=['GET'])
 def get_categories():
@@ -40,27 +53,84 @@ def create_category():
 # Forum Topic routes
 @forum_bp.route('/forum/topics', methods=['GET'])
 def get_topics():
-    """Retorna tópicos do fórum"""
-    category_id = request.args.get('category_id')
-    
-    query = ForumTopic.query
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    topics = query.order_by(
+    """Retorna tópicos do fórum
+    
+    Fixados primeiro, depois pela última atividade. Sem parâmetros devolve todos
+    os tópicos; com ``limit`` e/ou ``cursor`` devolve uma página (paginação por
+    chave) e ``next_cursor``, que vai em ``cursor`` para a página seguinte.
+    """
+    category_id = request.args.get('category_id', type=int)
+    cursor = request.args.get('cursor')
+    paginate = cursor is not None or 'limit' in request.args
+    limit = min(max(request.args.get('limit', DEFAULT_TOPICS_PAGE_SIZE, type=int), 1), MAX_TOPICS_PAGE_SIZE)
+    
+    # Autores vêm na mesma consulta (JOIN) em vez de uma carga preguiçosa por tópico
+    query = ForumTopic.query.options(joinedload(ForumTopic.user), joinedload(ForumTopic.last_post_user))
+    if category_id is not None:
+        query = query.filter(ForumTopic.category_id == category_id)
+    
+    if cursor:
+        position = _decode_topic_cursor(cursor)
+        if position is None:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        query = query.filter(_after_topic(*position))
+    
+    query = query.order_by(
         ForumTopic.is_pinned.desc(),
-        ForumTopic.last_post_at.desc()
-    ).all()
+        ForumTopic.last_post_at.desc(),
+        ForumTopic.id.desc()
+    )
+    if not paginate:
+        return jsonify({
+            'topics': [topic.to_dict() for topic in query.all()],
+            'next_cursor': None
+        }), 200
+    
+    # Uma linha a mais diz se existe página seguinte
+    topics = query.limit(limit + 1).all()
+    next_cursor = _encode_topic_cursor(topics[limit - 1]) if len(topics) > limit else None
+    topics = topics[:limit]
     
     return jsonify({
-        'topics': [topic.to_dict() for topic in topics]
+        'topics': [topic.to_dict() for topic in topics],
+        'next_cursor': next_cursor
     }), 200
 
+def _encode_topic_cursor(topic):
+    position = [bool(topic.is_pinned), topic.last_post_at.isoformat() if topic.last_post_at else None, topic.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+def _decode_topic_cursor(cursor):
+    try:
+        is_pinned, last_post_at, topic_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return (
+            bool(is_pinned),
+            datetime.fromisoformat(last_post_at) if last_post_at is not None else None,
+            int(topic_id)
+        )
+    except (binascii.Error, TypeError, ValueError):
+        return None
+
+def _after_topic(is_pinned, last_post_at, topic_id):
+    # Tópicos depois da posição na ordem (is_pinned DESC, last_post_at DESC, id DESC);
+    # no SQLite NULL é o menor valor, então tópicos sem last_post_at vêm por último
+    if last_post_at is None:
+        same_pin = db.and_(ForumTopic.last_post_at.is_(None), ForumTopic.id < topic_id)
+    else:
+        same_pin = db.or_(
+            ForumTopic.last_post_at < last_post_at,
+            ForumTopic.last_post_at.is_(None),
+            db.and_(ForumTopic.last_post_at == last_post_at, ForumTopic.id < topic_id)
+        )
+    pinned = db.literal(is_pinned, db.Boolean)
+    return db.or_(ForumTopic.is_pinned < pinned, db.and_(ForumTopic.is_pinned == pinned, same_pin))
+
 @forum_bp.route('/forum/topics', methods=['POST'])
 @login_required
 def create_topic():
     """Cria um novo tópico"""
     data = request.get_json()
+    category = ForumCategory.query.get_or_404(data.get('category_id'))
     
     topic = ForumTopic(
         category_id=data.get('category_id'),
@@ -70,6 +140,8 @@ def create_topic():
     )
     
     db.session.add(topic)
+    # Incremento em SQL: não perde atualizações concorrentes
+    category.topic_count = ForumCategory.topic_count + 1
     db.session.commit()
     
     return jsonify({
@@ -79,22 +151,60 @@ def create_topic():
 
 @forum_bp.route('/forum/topics/<int:topic_id>', methods=['GET'])
 def get_topic(topic_id):
-    """Retorna um tópico específico com suas postagens"""
+    """Retorna um tópico específico com suas postagens
+    
+    Sem parâmetros devolve todas as postagens. ``page`` (com ``per_page``)
+    escolhe uma página; ``after`` com o id da última postagem exibida continua a
+    partir dela. ``next_after`` é o valor para a próxima chamada com ``after``.
+    """
     topic = ForumTopic.query.get_or_404(topic_id)
+    paginate = any(name in request.args for name in ('page', 'after', 'per_page'))
+    per_page = min(max(request.args.get('per_page', DEFAULT_POSTS_PAGE_SIZE, type=int), 1), MAX_POSTS_PAGE_SIZE)
+    after_id = request.args.get('after', type=int)
+    page = None
+    if not paginate:
+        # Sem paginação (cliente antigo): o tópico inteiro, autores ainda em lote
+        posts = all_posts(topic)
+        total, per_page, total_pages, has_more = len(posts), None, 1, False
+    elif after_id is not None:
+        after_post = db.session.get(ForumPost, after_id)
+        if after_post is None or after_post.topic_id != topic_id:
+            return jsonify({'message': 'Invalid after post'}), 400
+        total = count_posts(topic)
+        total_pages = page_count(total, per_page)
+        posts, has_more = posts_after(topic, after_post, per_page)
+    else:
+        page = max(request.args.get('page', 1, type=int), 1)
+        total = count_posts(topic)
+        total_pages = page_count(total, per_page)
+        posts = posts_page(topic, page, per_page, total)
+        has_more = page < total_pages
     
-    # Increment view count
-    topic.views_count += 1
-    db.session.commit()
+    # A visualização vai para o buffer do worker (src/services/forum_views.py):
+    # a leitura não abre transação de escrita
+    app = current_app._get_current_object()
+    record_view(app, topic_id, session if app.config.get('FORUM_VIEW_DEDUP') else None)
     
-    # Get posts
-    posts = ForumPost.query.filter_by(topic_id=topic_id).order_by(ForumPost.created_at.asc()).all()
+    topic_data = topic.to_dict()
+    topic_data['views_count'] = (topic.views_count or 0) + pending_views(topic_id)
+    topic_data['posts_count'] = total
     
     return jsonify({
-        'topic': topic.to_dict(),
-        'posts': [post.to_dict() for post in posts]
+        'topic': topic_data,
+        'posts': posts_to_dicts(posts),
+        'page': page,
+        'per_page': per_page,
+        'total_pages': total_pages,
+        'next_after': posts[-1].id if posts and has_more else None
     }), 200
 
 # Forum Post routes
+def _add_category_posts(category_id, delta):
+    # UPDATE direto: não carrega a categoria e não perde incrementos concorrentes
+    db.session.execute(db.update(ForumCategory).where(ForumCategory.id == category_id).values(
+        post_count=ForumCategory.post_count + delta
+    ))
+
 @forum_bp.route('/forum/posts', methods=['POST'])
 @login_required
 def create_post():
@@ -119,6 +229,7 @@ def create_post():
     topic.posts_count += 1
     topic.last_post_at = datetime.utcnow()
     topic.last_post_user_id = current_user.id
+    _add_category_posts(topic.category_id, 1)
     
     db.session.commit()
     
@@ -165,6 +276,7 @@ def delete_post(post_id):
     
     # Update topic stats
     topic.posts_count = max(0, topic.posts_count - 1)
+    _add_category_posts(topic.category_id, -1)
     
     # Update last post info
     last_post = ForumPost.query.filter_by(topic_id=topic.id).order_by(ForumPost.created_at.desc()).first()
@@ -234,25 +346,13 @@ def delete_guestbook_entry(entry_id):
 # Search routes
 @forum_bp.route('/forum/search', methods=['GET'])
 def search_forum():
-    """Busca no fórum"""
+    """Busca no fórum (texto completo, ordenado por relevância, com ``page``/``per_page``)"""
     query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
     
     if len(query) < 3:
-        return jsonify({'topics': [], 'posts': []}), 200
-    
-    # Search topics
-    topics = ForumTopic.query.filter(
-        ForumTopic.title.ilike(f'%{query}%') |
-        ForumTopic.content.ilike(f'%{query}%')
-    ).limit(10).all()
+        return jsonify({'topics': [], 'posts': [], 'page': page, 'per_page': per_page}), 200
     
-    # Search posts
-    posts = ForumPost.query.filter(
-        ForumPost.content.ilike(f'%{query}%')
-    ).limit(10).all()
-    
-    return jsonify({
-        'topics': [topic.to_dict() for topic in topics],
-        'posts': [post.to_dict() for post in posts]
-    }), 200
-
+    results = search_forum_index(query, page, per_page)
+    return jsonify(dict(results, page=page, per_page=per_page)), 200
@@ -1,23 +1,275 @@
-from flask import Blueprint, request, jsonify
+import io
+import json
+import re
+import zlib
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_login import login_required, current_user
-from src.models.person import Person
-from src.models.family_tree import FamilyTree, UserPersonConnection
+from src.models.person import Person, PersonAncestry, DuplicateCandidate
+from src.models.family_tree import (
+    ConnectionSuggestion, FamilyStats, FamilyTree, UserPersonConnection, bump_tree_version, current_tree_version
+)
+from src.services.person_graph import get_person_graph, record_links, record_person_links
+from src.services.kinship import describe, find_kinship
+from src.services.gedcom import export_subtree, export_tree, import_gedcom
+from src.services.person_batch import BatchError, apply_person_batch
+from src.services.ancestry import is_ancestor, refresh_ancestry
+from src.services.dedup import MergeError, merge_persons
+from src.services.person_search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_persons
+from src.services.places import assign_places, place_stats
+from src.services.columnar import pack_columns, tree_columns
+from src.services.family_stats import person_stat_counts, reconcile_family_stats, tree_stats, update_family_stats
+from src.services.family_trees import rebuild_tree_membership, tree_member_counts
+from src.services.chart_layout import (
+    DEFAULT_LAYOUT_DEPTH, LAYOUT_TYPES, MAX_LAYOUT_DEPTH, LayoutTooLarge, get_layout
+)
 from src.database import db
 
 genealogy_bp = Blueprint('genealogy_bp', __name__)
 
+# Paginação e streaming da árvore
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+STREAM_BATCH_SIZE = 1000
+
+# Leituras condicionais (If-None-Match): as ETags derivam da versão da árvore,
+# incrementada por toda escrita, e da row_version de cada pessoa
+CACHE_CONTROL = 'private, no-cache'
+PERSON_ETAG_RE = re.compile(r'^person-(\d+)-(\d+)-(\d+)$')
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+def _not_modified(etag):
+    return _with_etag(Response(status=304), etag)
+
+def _tree_etag(resource):
+    # A query string entra na ETag: filtros, ordenação e formato mudam a resposta
+    return f'{resource}-{current_tree_version()}-{zlib.crc32(request.query_string):08x}'
+
+# Sem data de morte, uma pessoa nascida há mais que isso não conta como viva em ``alive_in``
+MAX_LIFESPAN = 110
+
+def _life_date_filters():
+    """Condições SQL dos filtros por ano (born_from, born_to, died_from, died_to, alive_in)
+    
+    Retorna (condições, mensagem de erro).
+    """
+    years = {}
+    for param in ('born_from', 'born_to', 'died_from', 'died_to', 'alive_in'):
+        value = request.args.get(param)
+        if value is None:
+            continue
+        if not value.lstrip('-').isdigit():
+            return None, f'{param} must be a year'
+        years[param] = int(value)
+    
+    conditions = []
+    if 'born_from' in years:
+        conditions.append(Person.birth_year >= years['born_from'])
+    if 'born_to' in years:
+        conditions.append(Person.birth_year <= years['born_to'])
+    if 'died_from' in years:
+        conditions.append(Person.death_year >= years['died_from'])
+    if 'died_to' in years:
+        conditions.append(Person.death_year <= years['died_to'])
+    if 'alive_in' in years:
+        year = years['alive_in']
+        conditions.append(Person.birth_year <= year)
+        conditions.append(db.or_(
+            Person.death_year >= year,
+            db.and_(Person.death_year.is_(None), Person.birth_year > year - MAX_LIFESPAN)
+        ))
+    return conditions, None
+
+def _birth_order():
+    # Datas desconhecidas por último
+    return [Person.birth_year.asc().nulls_last(), Person.birth_month.asc().nulls_first(),
+            Person.birth_day.asc().nulls_first()]
+
 @genealogy_bp.route('/family-tree', methods=['GET'])
 @login_required
 def get_family_tree():
-    """Retorna a árvore genealógica da família Baroni"""
-    # Por enquanto, retorna todas as pessoas
-    persons = Person.query.all()
-    tree_data = []
+    """Retorna a árvore genealógica da família Baroni
+    
+    Sem parâmetros devolve todas as pessoas de uma vez. Com ``after_id``/``limit``
+    devolve uma página ordenada por id (paginação por chave) e com
+    ``format=ndjson`` transmite uma pessoa por linha com memória constante.
+    ``format=columnar`` devolve vetores paralelos para o visualizador
+    (``encoding=binary`` para o buffer compacto; ver src.services.columnar).
+    ``sort=generation`` ou ``sort=birth`` ordena pela geração materializada ou
+    pela data de nascimento (exceto na paginação). Os filtros por ano
+    (``born_from``, ``born_to``, ``died_from``, ``died_to``, ``alive_in``) valem
+    nos três modos.
+    """
+    return _persons_response([], 'tree')
+
+def _persons_response(scope, resource):
+    # Corpo comum de /family-tree e /family-trees/<id>/persons; ``scope`` restringe as pessoas
+    conditions, error = _life_date_filters()
+    if error:
+        return jsonify({'message': error}), 400
+    conditions = [*scope, *conditions]
+    
+    etag = _tree_etag(resource)
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    
+    order_by = [Person.id]
+    if request.args.get('sort') == 'generation':
+        order_by.insert(0, Person.generation)
+    elif request.args.get('sort') == 'birth':
+        order_by[:0] = _birth_order()
+    
+    if request.args.get('format') == 'columnar':
+        columns = tree_columns(conditions, order_by)
+        if request.args.get('encoding') == 'binary':
+            return _with_etag(Response(pack_columns(columns), mimetype='application/octet-stream'), etag), 200
+        return _with_etag(jsonify(columns), etag), 200
+    
+    if request.args.get('format') == 'ndjson':
+        return _with_etag(Response(
+            stream_with_context(_stream_persons_ndjson(conditions, order_by)), mimetype='application/x-ndjson'
+        ), etag)
+    
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
     
-    for person in persons:
-        tree_data.append(person.to_dict())
+    if after_id is None and limit is None:
+        query = Person.dict_select().where(*conditions).order_by(*order_by)
+        tree_data = [row._asdict() for row in db.session.execute(query)]
+        return _with_etag(jsonify({'tree': tree_data}), etag), 200
     
-    return jsonify({'tree': tree_data}), 200
+    query = Person.dict_select().where(*conditions).order_by(Person.id)
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    if after_id is not None:
+        query = query.where(Person.id > after_id)
+    
+    tree_data = [row._asdict() for row in db.session.execute(query.limit(limit))]
+    next_after_id = tree_data[-1]['id'] if len(tree_data) == limit else None
+    
+    return _with_etag(jsonify({'tree': tree_data, 'next_after_id': next_after_id}), etag), 200
+
+def _stream_persons_ndjson(conditions, order_by):
+    query = Person.dict_select().where(*conditions).order_by(*order_by).execution_options(
+        yield_per=STREAM_BATCH_SIZE
+    )
+    for partition in db.session.execute(query).partitions():
+        yield ''.join(json.dumps(row._asdict(), ensure_ascii=False) + '\n' for row in partition)
+
+@genealogy_bp.route('/family-tree/import', methods=['POST'])
+@login_required
+def import_family_tree():
+    """Importa pessoas e famílias de um arquivo GEDCOM"""
+    if 'file' not in request.files:
+        return jsonify({'message': 'No file provided'}), 400
+    
+    gedcom_file = io.TextIOWrapper(request.files['file'].stream, encoding='utf-8-sig', errors='replace')
+    result = import_gedcom(gedcom_file)
+    
+    return jsonify({'message': 'GEDCOM imported successfully', 'import': result}), 201
+
+@genealogy_bp.route('/family-tree/export.ged', methods=['GET'])
+@login_required
+def export_family_tree():
+    """Exporta a árvore (ou a descendência de ``root``) em GEDCOM, em streaming"""
+    root_id = request.args.get('root', type=int)
+    depth = request.args.get('depth', type=int)
+    if depth is not None and depth < 0:
+        return jsonify({'message': 'Invalid depth'}), 400
+    
+    if root_id is None:
+        chunks = export_tree()
+    else:
+        graph = get_person_graph()
+        if root_id not in graph:
+            return jsonify({'message': 'Person not found'}), 404
+        chunks = export_subtree(graph, root_id, depth)
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/vnd.familysearch.gedcom',
+        headers={'Content-Disposition': 'attachment; filename=family-tree.ged'}
+    )
+
+@genealogy_bp.route('/family-trees', methods=['GET'])
+@login_required
+def get_family_trees():
+    """Retorna as árvores de família com o número de pessoas de cada uma"""
+    counts = tree_member_counts()
+    trees = FamilyTree.query.order_by(FamilyTree.id).all()
+    return jsonify({'trees': [dict(tree.to_dict(), person_count=counts.get(tree.id, 0)) for tree in trees]}), 200
+
+@genealogy_bp.route('/family-trees', methods=['POST'])
+@login_required
+def create_family_tree():
+    """Cria uma árvore de família a partir da sua pessoa raiz"""
+    data = request.get_json()
+    if not data.get('name'):
+        return jsonify({'message': 'name is required'}), 400
+    
+    tree = FamilyTree(name=data['name'], description=data.get('description'))
+    error = _set_tree_root(tree, data.get('root_person_id'))
+    if error:
+        return error
+    
+    db.session.add(tree)
+    return _save_family_tree(tree, 201)
+
+@genealogy_bp.route('/family-trees/<int:tree_id>', methods=['PUT'])
+@login_required
+def update_family_tree(tree_id):
+    """Atualiza nome, descrição ou raiz de uma árvore de família"""
+    tree = FamilyTree.query.get_or_404(tree_id)
+    data = request.get_json()
+    
+    tree.name = data.get('name', tree.name)
+    tree.description = data.get('description', tree.description)
+    if 'root_person_id' in data:
+        error = _set_tree_root(tree, data['root_person_id'])
+        if error:
+            return error
+    
+    return _save_family_tree(tree, 200)
+
+def _set_tree_root(tree, root_person_id):
+    if root_person_id is not None and db.session.get(Person, root_person_id) is None:
+        return jsonify({'message': 'Root person not found'}), 404
+    tree.root_person_id = root_person_id
+    return None
+
+def _save_family_tree(tree, status):
+    db.session.flush()
+    # Criar uma árvore ou trocar a raiz muda a pertinência de subárvores inteiras
+    rebuild_tree_membership()
+    version = bump_tree_version()
+    db.session.commit()
+    record_links([], version)
+    
+    return jsonify({'message': 'Family tree saved successfully', 'tree': tree.to_dict()}), status
+
+@genealogy_bp.route('/family-trees/<int:tree_id>/persons', methods=['GET'])
+@login_required
+def get_family_tree_persons(tree_id):
+    """Retorna as pessoas de uma árvore de família
+    
+    Aceita os mesmos formatos, filtros e ordenações de /family-tree; a leitura
+    usa o índice de tree_id e custa o tamanho da árvore, não o do banco.
+    """
+    FamilyTree.query.get_or_404(tree_id)
+    return _persons_response([Person.tree_id == tree_id], f'tree-{tree_id}')
+
+@genealogy_bp.route('/family-trees/<int:tree_id>/statistics', methods=['GET'])
+@login_required
+def get_family_tree_statistics(tree_id):
+    """Retorna as estatísticas de uma árvore de família"""
+    tree = FamilyTree.query.get_or_404(tree_id)
+    etag = _tree_etag(f'tree-{tree_id}-statistics')
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    
+    return _with_etag(jsonify(tree_stats(tree)), etag), 200
 
 @genealogy_bp.route('/person', methods=['POST'])
 @login_required
@@ -36,18 +288,110 @@ def add_person():
         father_id=data.get('father_id'),
         mother_id=data.get('mother_id')
     )
+    assign_places(new_person)
     
     db.session.add(new_person)
+    db.session.flush()
+    refresh_ancestry([new_person.id])
+    update_family_stats(added=person_stat_counts([new_person.id]), lineage=True)
+    version = bump_tree_version()
     db.session.commit()
     
+    record_person_links(new_person.id, new_person.father_id, new_person.mother_id, version)
+    
     return jsonify({'message': 'Person added successfully', 'person': new_person.to_dict()}), 201
 
+@genealogy_bp.route('/persons/batch', methods=['POST'])
+@login_required
+def batch_persons():
+    """Cria e atualiza várias pessoas numa única transação"""
+    data = request.get_json() or {}
+    
+    try:
+        results = apply_person_batch(data.get('items'))
+    except BatchError as error:
+        message, results = error.args
+        return jsonify({'message': message, 'results': results}), 400
+    
+    return jsonify({'message': 'Batch applied successfully', 'results': results}), 200
+
+@genealogy_bp.route('/persons/search', methods=['GET'])
+@login_required
+def search_persons_by_name():
+    """Busca pessoas pelo nome, ignorando acentos e tolerando erros de digitação"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'q is required'}), 400
+    limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    
+    return jsonify({'results': search_persons(query, limit)}), 200
+
+@genealogy_bp.route('/persons/duplicates', methods=['GET'])
+@login_required
+def get_duplicate_candidates():
+    """Retorna os pares de possíveis duplicatas, do mais provável ao menos provável"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    min_score = request.args.get('min_score', 0, type=float)
+    
+    candidates = DuplicateCandidate.query.filter(DuplicateCandidate.score >= min_score).order_by(
+        DuplicateCandidate.score.desc(), DuplicateCandidate.id
+    ).limit(limit).all()
+    
+    person_ids = {c.person_a_id for c in candidates} | {c.person_b_id for c in candidates}
+    persons = {p.id: p.to_dict() for p in Person.query.filter(Person.id.in_(person_ids)).all()}
+    
+    result = []
+    for candidate in candidates:
+        item = candidate.to_dict()
+        item['person_a'] = persons.get(candidate.person_a_id)
+        item['person_b'] = persons.get(candidate.person_b_id)
+        result.append(item)
+    
+    return jsonify({'candidates': result}), 200
+
+@genealogy_bp.route('/persons/merge', methods=['POST'])
+@login_required
+def merge_duplicate_persons():
+    """Funde uma pessoa duplicada (remove_id) em outra (keep_id)"""
+    data = request.get_json() or {}
+    keep = Person.query.get_or_404(data.get('keep_id'))
+    remove = Person.query.get_or_404(data.get('remove_id'))
+    
+    try:
+        person = merge_persons(keep, remove)
+    except MergeError as error:
+        return jsonify({'message': str(error)}), 400
+    
+    return jsonify({'message': 'Persons merged successfully', 'person': person.to_dict()}), 200
+
 @genealogy_bp.route('/person/<int:person_id>', methods=['GET'])
 @login_required
 def get_person(person_id):
-    """Retorna informações de uma pessoa específica"""
+    """Retorna informações de uma pessoa específica
+    
+    A ETag combina a row_version da pessoa e a versão da árvore: se a árvore não
+    mudou desde a ETag enviada, responde 304 sem ler a tabela person; se mudou,
+    compara só a row_version.
+    """
+    tree_version = current_tree_version()
+    known_row_version = None
+    for tag in request.if_none_match:
+        match = PERSON_ETAG_RE.match(tag)
+        if match and int(match.group(1)) == person_id:
+            if int(match.group(3)) == tree_version:
+                return _not_modified(tag)
+            known_row_version = int(match.group(2))
+    
+    if known_row_version is not None:
+        row_version = db.session.execute(
+            db.select(Person.row_version).where(Person.id == person_id)
+        ).scalar_one_or_none()
+        if row_version == known_row_version:
+            return _not_modified(f'person-{person_id}-{row_version}-{tree_version}')
+    
     person = Person.query.get_or_404(person_id)
-    return jsonify({'person': person.to_dict()}), 200
+    etag = f'person-{person_id}-{person.row_version}-{tree_version}'
+    return _with_etag(jsonify({'person': person.to_dict()}), etag), 200
 
 @genealogy_bp.route('/person/<int:person_id>', methods=['PUT'])
 @login_required
@@ -55,6 +399,15 @@ def update_person(person_id):
     """Atualiza informações de uma pessoa"""
     person = Person.query.get_or_404(person_id)
     data = request.get_json()
+    stats_before = person_stat_counts([person.id])
+    
+    father_id = data.get('father_id', person.father_id)
+    mother_id = data.get('mother_id', person.mother_id)
+    
+    # Impede ciclos: ninguém pode ser pai/mãe de si mesmo ou de um ancestral
+    for parent_id in (father_id, mother_id):
+        if parent_id is not None and is_ancestor(person.id, parent_id):
+            return jsonify({'message': 'Invalid parent: would create a cycle'}), 400
     
     person.name = data.get('name', person.name)
     person.birth_date = data.get('birth_date', person.birth_date)
@@ -63,13 +416,126 @@ def update_person(person_id):
     person.death_place = data.get('death_place', person.death_place)
     person.gender = data.get('gender', person.gender)
     person.notes = data.get('notes', person.notes)
-    person.father_id = data.get('father_id', person.father_id)
-    person.mother_id = data.get('mother_id', person.mother_id)
+    if 'birth_place' in data or 'death_place' in data:
+        assign_places(person)
     
+    links_changed = (father_id, mother_id) != (person.father_id, person.mother_id)
+    person.father_id = father_id
+    person.mother_id = mother_id
+    
+    db.session.flush()
+    if links_changed:
+        refresh_ancestry([person.id])
+    update_family_stats(removed=stats_before, added=person_stat_counts([person.id]), lineage=links_changed)
+    version = bump_tree_version()
     db.session.commit()
     
+    record_person_links(person.id, person.father_id, person.mother_id, version)
+    
     return jsonify({'message': 'Person updated successfully', 'person': person.to_dict()}), 200
 
+@genealogy_bp.route('/person/<int:person_id>/ancestors', methods=['GET'])
+@login_required
+def get_ancestors(person_id):
+    """Retorna os ancestrais de uma pessoa, anotados com a geração"""
+    return _lineage_response(person_id, 'ancestors')
+
+@genealogy_bp.route('/person/<int:person_id>/descendants', methods=['GET'])
+@login_required
+def get_descendants(person_id):
+    """Retorna os descendentes de uma pessoa, anotados com a geração"""
+    return _lineage_response(person_id, 'descendants')
+
+def _lineage_response(person_id, direction):
+    # Em cada item da linhagem, ``generation`` é relativa à pessoa consultada.
+    # Aceita os mesmos filtros por ano de /family-tree e ``sort=birth``.
+    depth = request.args.get('depth', type=int)
+    if depth is not None and depth < 0:
+        return jsonify({'message': 'Invalid depth'}), 400
+    conditions, error = _life_date_filters()
+    if error:
+        return jsonify({'message': error}), 400
+    
+    person = Person.query.get_or_404(person_id)
+    
+    # Uma única consulta indexada na tabela de fechamento traz toda a linhagem
+    if direction == 'ancestors':
+        query = db.session.query(Person, PersonAncestry.distance).join(
+            PersonAncestry, PersonAncestry.ancestor_id == Person.id
+        ).filter(PersonAncestry.descendant_id == person_id)
+    else:
+        query = db.session.query(Person, PersonAncestry.distance).join(
+            PersonAncestry, PersonAncestry.descendant_id == Person.id
+        ).filter(PersonAncestry.ancestor_id == person_id)
+    if depth is not None:
+        query = query.filter(PersonAncestry.distance <= depth)
+    query = query.filter(*conditions)
+    if request.args.get('sort') == 'birth':
+        query = query.order_by(*_birth_order(), Person.id)
+    else:
+        query = query.order_by(PersonAncestry.distance, Person.id)
+    
+    lineage = []
+    for other, distance in query:
+        item = other.to_dict()
+        item['generation'] = distance
+        lineage.append(item)
+    
+    return jsonify({'person': person.to_dict(), direction: lineage}), 200
+
+@genealogy_bp.route('/person/<int:person_id>/layout', methods=['GET'])
+@login_required
+def get_person_layout(person_id):
+    """Retorna as coordenadas do gráfico de pedigree ou de descendência de uma pessoa"""
+    layout_type = request.args.get('type', 'pedigree')
+    if layout_type not in LAYOUT_TYPES:
+        return jsonify({'message': 'type must be pedigree or descendants'}), 400
+    depth = request.args.get('depth', DEFAULT_LAYOUT_DEPTH[layout_type], type=int)
+    if depth < 0 or depth > MAX_LAYOUT_DEPTH:
+        return jsonify({'message': f'depth must be between 0 and {MAX_LAYOUT_DEPTH}'}), 400
+    
+    etag = _tree_etag(f'layout-{person_id}')
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    
+    graph = get_person_graph()
+    if person_id not in graph:
+        return jsonify({'message': 'Person not found'}), 404
+    try:
+        layout = get_layout(graph, person_id, layout_type, depth)
+    except LayoutTooLarge as error:
+        return jsonify({'message': str(error)}), 400
+    
+    return _with_etag(jsonify(layout), etag), 200
+
+@genealogy_bp.route('/kinship', methods=['GET'])
+@login_required
+def get_kinship():
+    """Calcula o parentesco entre duas pessoas (o que ``a`` é de ``b``)"""
+    person_a_id = request.args.get('a', type=int)
+    person_b_id = request.args.get('b', type=int)
+    if person_a_id is None or person_b_id is None:
+        return jsonify({'message': 'Parameters a and b are required'}), 400
+    
+    if Person.query.filter(Person.id.in_({person_a_id, person_b_id})).count() < len({person_a_id, person_b_id}):
+        return jsonify({'message': 'Person not found'}), 404
+    
+    kinship = find_kinship(person_a_id, person_b_id)
+    common_ids = kinship['common_ancestor_ids'] if kinship else []
+    persons = {p.id: p for p in Person.query.filter(Person.id.in_({person_a_id, person_b_id, *common_ids})).all()}
+    
+    if kinship:
+        kinship['relationship'], kinship['label'] = describe(
+            kinship['distance_a'], kinship['distance_b'], kinship['half'], persons[person_a_id].gender
+        )
+        kinship['common_ancestors'] = [persons[i].to_dict() for i in common_ids]
+    
+    return jsonify({
+        'person_a': persons[person_a_id].to_dict(),
+        'person_b': persons[person_b_id].to_dict(),
+        'kinship': kinship
+    }), 200
+
 @genealogy_bp.route('/connect-person', methods=['POST'])
 @login_required
 def connect_user_to_person():
@@ -98,7 +564,12 @@ def connect_user_to_person():
     )
     
     db.session.add(connection)
+    db.session.flush()
+    # /statistics conta os usuários conectados
+    update_family_stats(users=True)
+    version = bump_tree_version()
     db.session.commit()
+    record_links([], version)
     
     return jsonify({'message': 'Connection created successfully'}), 201
 
@@ -119,35 +590,93 @@ def get_my_connections():
     
     return jsonify({'connections': result}), 200
 
+@genealogy_bp.route('/my-connection-suggestions', methods=['GET'])
+@login_required
+def get_my_connection_suggestions():
+    """Retorna as conexões sugeridas a partir dos ancestrais declarados no cadastro"""
+    suggestions = ConnectionSuggestion.query.filter(
+        ConnectionSuggestion.user_id == current_user.id, ConnectionSuggestion.dismissed.is_not(True)
+    ).order_by(ConnectionSuggestion.relationship_type, ConnectionSuggestion.confidence.desc()).all()
+    
+    person_ids = {suggestion.person_id for suggestion in suggestions}
+    persons = {p.id: p.to_dict() for p in Person.query.filter(Person.id.in_(person_ids)).all()}
+    
+    result = []
+    for suggestion in suggestions:
+        item = suggestion.to_dict()
+        item['person'] = persons.get(suggestion.person_id)
+        result.append(item)
+    
+    return jsonify({'suggestions': result}), 200
+
+@genealogy_bp.route('/my-connection-suggestions/<int:suggestion_id>/accept', methods=['POST'])
+@login_required
+def accept_connection_suggestion(suggestion_id):
+    """Aceita uma sugestão, criando a conexão do usuário com a pessoa"""
+    suggestion = ConnectionSuggestion.query.filter_by(id=suggestion_id, user_id=current_user.id).first_or_404()
+    if db.session.get(Person, suggestion.person_id) is None:
+        # Pessoa removida depois da sugestão: a sugestão não vale mais
+        db.session.delete(suggestion)
+        db.session.commit()
+        return jsonify({'message': 'Person not found'}), 404
+    
+    existing_connection = UserPersonConnection.query.filter_by(
+        user_id=current_user.id,
+        person_id=suggestion.person_id
+    ).first()
+    if existing_connection:
+        return jsonify({'message': 'Connection already exists'}), 409
+    
+    connection = UserPersonConnection(
+        user_id=current_user.id,
+        person_id=suggestion.person_id,
+        relationship_type=suggestion.relationship_type
+    )
+    db.session.add(connection)
+    # As demais sugestões para a mesma posição deixam de fazer sentido
+    ConnectionSuggestion.query.filter_by(
+        user_id=current_user.id, relationship_type=suggestion.relationship_type
+    ).delete(synchronize_session=False)
+    db.session.flush()
+    update_family_stats(users=True)
+    version = bump_tree_version()
+    db.session.commit()
+    record_links([], version)
+    
+    return jsonify({'message': 'Connection created successfully'}), 201
+
+@genealogy_bp.route('/my-connection-suggestions/<int:suggestion_id>', methods=['DELETE'])
+@login_required
+def dismiss_connection_suggestion(suggestion_id):
+    """Recusa uma sugestão de conexão"""
+    suggestion = ConnectionSuggestion.query.filter_by(id=suggestion_id, user_id=current_user.id).first_or_404()
+    suggestion.dismissed = True
+    db.session.commit()
+    
+    return jsonify({'message': 'Suggestion dismissed'}), 200
+
+@genealogy_bp.route('/places/stats', methods=['GET'])
+@login_required
+def get_place_statistics():
+    """Retorna o número de nascimentos e mortes por lugar"""
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({'message': 'Invalid limit'}), 400
+    
+    return jsonify({'places': place_stats(limit)}), 200
+
 @genealogy_bp.route('/statistics', methods=['GET'])
 @login_required
 def get_statistics():
     """Retorna estatísticas da família"""
-    total_persons = Person.query.count()
-    total_users = db.session.query(UserPersonConnection.user_id).distinct().count()
-    
-    # Calcular gerações (simplificado)
-    max_generation = 0
-    root_persons = Person.query.filter_by(father_id=None, mother_id=None).all()
-    
-    def calculate_generation(person, generation=0):
-        nonlocal max_generation
-        max_generation = max(max_generation, generation)
-        
-        # Buscar filhos
-        children = Person.query.filter(
-            (Person.father_id == person.id) | (Person.mother_id == person.id)
-        ).all()
-        
-        for child in children:
-            calculate_generation(child, generation + 1)
-    
-    for root in root_persons:
-        calculate_generation(root)
+    etag = _tree_etag('statistics')
+    if etag in request.if_none_match:
+        return _not_modified(etag)
     
-    return jsonify({
-        'total_persons': total_persons,
-        'total_users': total_users,
-        'generations': max_generation + 1
-    }), 200
-
+    # Snapshot mantido pelas escritas (src/services/family_stats.py)
+    stats = db.session.get(FamilyStats, 1)
+    if stats is None:
+        stats = reconcile_family_stats()
+        db.session.commit()
+    
+    return _with_etag(jsonify(stats.to_dict()), etag), 200
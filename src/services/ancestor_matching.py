@@ -0,0 +1,237 @@
+"""Casamento dos ancestrais declarados no cadastro (User.father_name ...
+great_grandmother_maternal_maternal_name) com pessoas da árvore.
+
+Cada coluna corresponde a uma posição no pedigree, descrita pelo caminho de
+passos 'father'/'mother' a partir do usuário. O índice de nomes de Person é
+montado uma vez por execução (pessoas agrupadas pelo código fonético do primeiro
+e do último nome) e todos os usuários são casados contra ele em memória.
+
+A posição restringe os candidatos:
+
+* o gênero e a faixa de anos de nascimento plausível para a geração;
+* se a posição abaixo (ex.: o pai, para o avô paterno) já tem um candidato
+  confiável, o avô paterno só pode ser o pai cadastrado desse candidato;
+* a confiança de um candidato soma a similaridade do seu nome com a dos seus
+  pais/avós cadastrados que batem com os nomes declarados acima dele, dividida
+  pelo total possível.
+"""
+from src.database import db
+from src.models.user import User
+from src.models.person import Person
+from src.models.family_tree import ConnectionSuggestion, UserPersonConnection
+from src.services.dates import parse_partial_date
+from src.services.names import name_similarity, normalize_name, phonetic_key
+
+MIN_NAME_SIMILARITY = 0.75
+MIN_CONFIDENCE = 0.6
+SUGGESTIONS_PER_POSITION = 3
+# Um primeiro nome sem sobrenome só é procurado na árvore toda se for raro
+MAX_FIRST_NAME_BLOCK = 2000
+
+# Coluna de User -> caminho no pedigree a partir do usuário
+ANCESTOR_POSITIONS = {
+    'father_name': ('father',),
+    'mother_name': ('mother',),
+    'grandfather_paternal_name': ('father', 'father'),
+    'grandmother_paternal_name': ('father', 'mother'),
+    'grandfather_maternal_name': ('mother', 'father'),
+    'grandmother_maternal_name': ('mother', 'mother'),
+    'great_grandfather_paternal_paternal_name': ('father', 'father', 'father'),
+    'great_grandmother_paternal_paternal_name': ('father', 'father', 'mother'),
+    'great_grandfather_paternal_maternal_name': ('father', 'mother', 'father'),
+    'great_grandmother_paternal_maternal_name': ('father', 'mother', 'mother'),
+    'great_grandfather_maternal_paternal_name': ('mother', 'father', 'father'),
+    'great_grandmother_maternal_paternal_name': ('mother', 'father', 'mother'),
+    'great_grandfather_maternal_maternal_name': ('mother', 'mother', 'father'),
+    'great_grandmother_maternal_maternal_name': ('mother', 'mother', 'mother'),
+}
+EXCLUDED_GENDER = {'father': 'F', 'mother': 'M'}
+
+class NameIndex:
+    """Pessoas da árvore em memória, com blocos por código fonético dos nomes.
+
+    Dentro de cada bloco as pessoas são agrupadas pelo nome normalizado: a
+    similaridade é calculada uma vez por nome distinto, não por pessoa.
+    """
+
+    def __init__(self):
+        self.persons = {}      # id -> (nome normalizado, father_id, mother_id, gênero, ano de nascimento)
+        self.by_full = {}      # (código do primeiro nome, código do último) -> {nome: [ids]}
+        self.by_first = {}     # código do primeiro nome -> {nome: [ids]}
+        self._codes = {}
+        self._similarities = {}
+
+    def code(self, word):
+        code = self._codes.get(word)
+        if code is None:
+            code = self._codes[word] = phonetic_key(word)
+        return code
+
+    def load(self):
+        query = db.select(
+            Person.id, Person.name_normalized, Person.father_id, Person.mother_id,
+            Person.gender, Person.birth_year
+        )
+        for person_id, name, father_id, mother_id, gender, birth_year in db.session.connection().execute(query):
+            name = name or ''
+            self.persons[person_id] = (name, father_id, mother_id, gender, birth_year)
+            words = name.split()
+            if not words:
+                continue
+            first = self.code(words[0])
+            self.by_first.setdefault(first, {}).setdefault(name, []).append(person_id)
+            if len(words) > 1:
+                self.by_full.setdefault((first, self.code(words[-1])), {}).setdefault(name, []).append(person_id)
+        return self
+
+    def similarity(self, declared, name):
+        key = (declared, name)
+        similarity = self._similarities.get(key)
+        if similarity is None:
+            similarity = self._similarities[key] = name_similarity(declared, name)
+        return similarity
+
+    def candidates(self, declared):
+        """Grupos (nome, ids) do bloco do nome declarado"""
+        words = declared.split()
+        if len(words) > 1:
+            return self.by_full.get((self.code(words[0]), self.code(words[-1])), {}).items()
+        block = self.by_first.get(self.code(words[0]), {})
+        if sum(len(ids) for ids in block.values()) > MAX_FIRST_NAME_BLOCK:
+            return ()
+        return block.items()
+
+def _year_range(user_year, depth):
+    # Pais nascem de 12 a 70 anos antes dos filhos
+    if user_year is None:
+        return None
+    return user_year - 70 * depth, user_year - 12 * depth
+
+def _plausible(person, step, years):
+    _, _, _, gender, birth_year = person
+    if gender is not None and gender == EXCLUDED_GENDER[step]:
+        return False
+    return years is None or birth_year is None or years[0] <= birth_year <= years[1]
+
+def _support(index, declared, person_id, path):
+    """Soma das similaridades dos pais cadastrados que batem com os nomes declarados acima de ``path``"""
+    total = 0.0
+    _, father_id, mother_id = index.persons[person_id][:3]
+    for step, parent_id in (('father', father_id), ('mother', mother_id)):
+        name = declared.get(path + (step,))
+        if name is None or parent_id not in index.persons:
+            continue
+        similarity = index.similarity(name, index.persons[parent_id][0])
+        if similarity >= MIN_NAME_SIMILARITY:
+            total += similarity + _support(index, declared, parent_id, path + (step,))
+    return total
+
+def _declared_above(declared, path):
+    return sum(1 for other in declared if len(other) > len(path) and other[:len(path)] == path)
+
+def match_user(index, declared, user_year, self_person_id=None):
+    """Propõe pessoas para cada posição declarada; retorna {caminho: [(person_id, confiança)]}"""
+    best = {(): self_person_id} if self_person_id in index.persons else {}
+    proposals = {}
+    for path in sorted(declared, key=len):
+        step = path[-1]
+        name = declared[path]
+        above = _declared_above(declared, path)
+        scored = {}
+        base = best.get(path[:-1])
+        if base is not None:
+            # Posição ancorada: só o pai/mãe cadastrado da pessoa da posição abaixo
+            parent_id = index.persons[base][1 if step == 'father' else 2]
+            if parent_id in index.persons:
+                similarity = index.similarity(name, index.persons[parent_id][0])
+                if similarity >= MIN_NAME_SIMILARITY:
+                    confidence = (similarity + _support(index, declared, parent_id, path)) / (1 + above)
+                    if confidence >= MIN_CONFIDENCE:
+                        scored[parent_id] = confidence
+        if not scored:
+            years = _year_range(user_year, len(path))
+            for candidate_name, person_ids in index.candidates(name):
+                similarity = index.similarity(name, candidate_name)
+                if similarity < MIN_NAME_SIMILARITY:
+                    continue
+                # Sem pais cadastrados não há suporte possível dos nomes declarados acima
+                orphan_confidence = similarity / (1 + above)
+                for person_id in person_ids:
+                    person = index.persons[person_id]
+                    if not _plausible(person, step, years):
+                        continue
+                    if person[1] is None and person[2] is None:
+                        confidence = orphan_confidence
+                    else:
+                        confidence = (similarity + _support(index, declared, person_id, path)) / (1 + above)
+                    if confidence >= MIN_CONFIDENCE:
+                        scored[person_id] = confidence
+        if not scored:
+            continue
+
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+        # Candidatos praticamente empatados dividem a confiança
+        tied = sum(1 for _, confidence in ranked if confidence >= ranked[0][1] - 0.05)
+        proposals[path] = [(person_id, confidence / tied) for person_id, confidence in ranked[:SUGGESTIONS_PER_POSITION]]
+        # Só um candidato claramente melhor ancora as posições acima
+        if tied == 1:
+            best[path] = ranked[0][0]
+    return proposals
+
+def match_user_ancestors(user_ids=None):
+    """Recalcula as sugestões de conexão (de todos os usuários, se ``user_ids`` for None).
+
+    Retorna um resumo com o número de usuários e de sugestões.
+    """
+    index = NameIndex().load()
+    relationship_by_path = {path: column[:-len('_name')] for column, path in ANCESTOR_POSITIONS.items()}
+
+    columns = [getattr(User, column) for column in ANCESTOR_POSITIONS]
+    query = db.select(User.id, User.birth_date, *columns)
+    connections = db.select(UserPersonConnection.user_id, UserPersonConnection.person_id,
+                            UserPersonConnection.relationship_type)
+    dismissed = db.select(ConnectionSuggestion.user_id, ConnectionSuggestion.person_id).where(
+        ConnectionSuggestion.dismissed.is_(True))
+    outdated = db.delete(ConnectionSuggestion).where(ConnectionSuggestion.dismissed.is_not(True))
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        query = query.where(User.id.in_(user_ids))
+        connections = connections.where(UserPersonConnection.user_id.in_(user_ids))
+        dismissed = dismissed.where(ConnectionSuggestion.user_id.in_(user_ids))
+        outdated = outdated.where(ConnectionSuggestion.user_id.in_(user_ids))
+
+    # Pessoas já conectadas ou recusadas não são sugeridas de novo
+    connected = {}
+    for user_id, person_id in db.session.execute(dismissed):
+        connected.setdefault(user_id, set()).add(person_id)
+    self_persons = {}
+    for user_id, person_id, relationship_type in db.session.execute(connections):
+        connected.setdefault(user_id, set()).add(person_id)
+        if relationship_type == 'self':
+            self_persons[user_id] = person_id
+
+    rows = []
+    users = 0
+    for user_id, birth_date, *names in db.session.execute(query):
+        declared = {}
+        for path, name in zip(ANCESTOR_POSITIONS.values(), names):
+            normalized = normalize_name(name)
+            if normalized:
+                declared[path] = normalized
+        if not declared:
+            continue
+        users += 1
+        user_year = parse_partial_date(birth_date)[0]
+        proposals = match_user(index, declared, user_year, self_persons.get(user_id))
+        for path, ranked in proposals.items():
+            for person_id, confidence in ranked:
+                if person_id not in connected.get(user_id, ()):
+                    rows.append({
+                        'user_id': user_id, 'person_id': person_id,
+                        'relationship_type': relationship_by_path[path], 'confidence': round(confidence, 4),
+                    })
+
+    db.session.execute(outdated)
+    if rows:
+        db.session.execute(ConnectionSuggestion.__table__.insert(), rows)
+    return {'users': users, 'suggestions': len(rows), 'persons_indexed': len(index.persons)}
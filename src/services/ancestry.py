@@ -0,0 +1,205 @@
+"""Manutenção incremental da tabela de fechamento ``person_ancestry`` e das
+colunas materializadas ``Person.generation``/``Person.descendant_count``.
+
+Quando os pais de uma pessoa mudam, só mudam os ancestrais (e a geração) dela
+e de seus descendentes. ``refresh_ancestry`` recalcula exatamente esse
+conjunto, dentro da transação corrente (enxergando as escritas ainda não
+confirmadas):
+
+1. descendentes atuais das pessoas alteradas, lidos da própria tabela;
+2. (id, father_id, mother_id) de todas as pessoas afetadas;
+3. linhas de fechamento e geração dos pais que estão fora do conjunto afetado;
+4. passagem topológica calculando {ancestral: menor distância} e a geração
+   de cada uma;
+5. DELETE das linhas antigas e INSERT (executemany) das novas;
+6. recontagem de descendentes só para os ancestrais antigos e novos;
+7. árvore de família (``tree_id``) das afetadas e dos seus pais.
+"""
+from collections import deque
+from src.database import db
+from src.models.person import Person, PersonAncestry
+from src.models.family_tree import bump_tree_version
+from src.services.batching import chunks
+from src.services.family_trees import rebuild_tree_membership, refresh_tree_membership
+
+INSERT_BATCH_SIZE = 20000
+
+def _compute(rows, external, external_generations):
+    """Calcula o fechamento e a geração das pessoas em ``rows`` (tuplas id, father_id, mother_id).
+
+    ``external`` mapeia cada pai fora do conjunto para o seu {ancestral: distância}
+    e ``external_generations`` para a sua geração. Pessoas presas em ciclos ficam
+    de fora dos dois resultados.
+    """
+    parents = {}
+    children = {}
+    pending = {}
+    for person_id, father_id, mother_id in rows:
+        known = {p for p in (father_id, mother_id) if p is not None and p != person_id}
+        parents[person_id] = known
+        pending[person_id] = 0
+    for person_id, known in parents.items():
+        for parent_id in known:
+            if parent_id in parents:
+                children.setdefault(parent_id, []).append(person_id)
+                pending[person_id] += 1
+
+    closure = {}
+    generations = {}
+    queue = deque(person_id for person_id, count in pending.items() if count == 0)
+    while queue:
+        person_id = queue.popleft()
+        ancestors = {}
+        generation = 0
+        for parent_id in parents[person_id]:
+            parent_ancestors = closure.get(parent_id)
+            if parent_ancestors is None:
+                parent_ancestors = external.get(parent_id)
+                if parent_ancestors is None:
+                    continue   # pai inexistente (id órfão)
+                parent_generation = external_generations.get(parent_id) or 0
+            else:
+                parent_generation = generations[parent_id]
+            generation = max(generation, parent_generation + 1)
+            ancestors[parent_id] = 1
+            for ancestor_id, distance in parent_ancestors.items():
+                if distance + 1 < ancestors.get(ancestor_id, distance + 2):
+                    ancestors[ancestor_id] = distance + 1
+        closure[person_id] = ancestors
+        generations[person_id] = generation
+        for child_id in children.get(person_id, ()):
+            pending[child_id] -= 1
+            if pending[child_id] == 0:
+                queue.append(child_id)
+    return closure, generations
+
+def _write(closure, replaced_ids=()):
+    ancestry_table = PersonAncestry.__table__
+    for chunk in chunks(replaced_ids):
+        db.session.execute(ancestry_table.delete().where(ancestry_table.c.descendant_id.in_(chunk)))
+    # Milhões de linhas em importações grandes: tuplas direto no executemany do
+    # driver evitam o custo do SQLAlchemy por parâmetro
+    insert = 'INSERT INTO person_ancestry (ancestor_id, descendant_id, distance) VALUES (?, ?, ?)'
+    connection = db.session.connection()
+    batch = []
+    for descendant_id, ancestors in closure.items():
+        batch.extend((ancestor_id, descendant_id, distance) for ancestor_id, distance in ancestors.items())
+        if len(batch) >= INSERT_BATCH_SIZE:
+            connection.exec_driver_sql(insert, batch)
+            batch = []
+    if batch:
+        connection.exec_driver_sql(insert, batch)
+
+def _write_generations(generations):
+    # Só as linhas cuja geração mudou são escritas (e têm row_version incrementada)
+    person_table = Person.__table__
+    statement = person_table.update().where(
+        person_table.c.id == db.bindparam('person_id'),
+        person_table.c.generation.is_not(db.bindparam('new_generation')),
+    ).values(generation=db.bindparam('new_generation'), row_version=person_table.c.row_version + 1)
+    params = [{'person_id': person_id, 'new_generation': generation}
+              for person_id, generation in generations.items()]
+    for start in range(0, len(params), INSERT_BATCH_SIZE):
+        db.session.execute(statement, params[start:start + INSERT_BATCH_SIZE])
+
+def recount_descendants(person_ids=None):
+    """Recalcula descendant_count (de todos, se ``person_ids`` for None) pela chave primária do fechamento"""
+    person_table = Person.__table__
+    count = (
+        db.select(db.func.count())
+        .where(PersonAncestry.ancestor_id == person_table.c.id)
+        .scalar_subquery()
+    )
+    statement = person_table.update().where(person_table.c.descendant_count != count).values(
+        descendant_count=count, row_version=person_table.c.row_version + 1
+    )
+    if person_ids is None:
+        db.session.execute(statement)
+        return
+    for chunk in chunks(person_ids):
+        db.session.execute(statement.where(person_table.c.id.in_(chunk)))
+
+def _ancestors_of(person_ids):
+    ancestor_ids = set()
+    for chunk in chunks(person_ids):
+        ancestor_ids.update(db.session.execute(
+            db.select(PersonAncestry.ancestor_id).where(PersonAncestry.descendant_id.in_(chunk)).distinct()
+        ).scalars())
+    return ancestor_ids
+
+def refresh_ancestry(person_ids):
+    """Recalcula o fechamento das pessoas dadas e de todos os seus descendentes.
+
+    Deve ser chamada na mesma transação da escrita que alterou father_id/mother_id
+    (ou criou as pessoas), depois do flush. Retorna os ids afetados.
+    """
+    changed = set(person_ids)
+    affected = set(changed)
+    for chunk in chunks(changed):
+        affected.update(db.session.execute(
+            db.select(PersonAncestry.descendant_id).where(PersonAncestry.ancestor_id.in_(chunk))
+        ).scalars())
+
+    rows = []
+    for chunk in chunks(affected):
+        rows.extend(db.session.execute(
+            db.select(Person.id, Person.father_id, Person.mother_id).where(Person.id.in_(chunk))
+        ).all())
+
+    outside = {parent_id for _, father_id, mother_id in rows for parent_id in (father_id, mother_id)
+               if parent_id is not None and parent_id not in affected}
+    external = {}
+    external_generations = {}
+    for chunk in chunks(outside):
+        for parent_id, generation in db.session.execute(
+            db.select(Person.id, Person.generation).where(Person.id.in_(chunk))
+        ):
+            external[parent_id] = {}
+            external_generations[parent_id] = generation
+    for chunk in chunks(external):
+        for ancestor_id, descendant_id, distance in db.session.execute(
+            db.select(PersonAncestry.ancestor_id, PersonAncestry.descendant_id, PersonAncestry.distance)
+            .where(PersonAncestry.descendant_id.in_(chunk))
+        ):
+            external[descendant_id][ancestor_id] = distance
+
+    # Ancestrais antigos e novos das pessoas afetadas têm a contagem de descendentes alterada
+    old_ancestors = _ancestors_of(affected)
+    old_parents = set()
+    for chunk in chunks(changed):
+        old_parents.update(db.session.execute(
+            db.select(PersonAncestry.ancestor_id)
+            .where(PersonAncestry.descendant_id.in_(chunk), PersonAncestry.distance == 1)
+        ).scalars())
+    closure, generations = _compute(rows, external, external_generations)
+    _write(closure, affected)
+    _write_generations(generations)
+    recount = old_ancestors
+    for ancestors in closure.values():
+        recount.update(ancestors)
+    recount_descendants(recount)
+    parents = {parent_id for _, father_id, mother_id in rows for parent_id in (father_id, mother_id)
+               if parent_id is not None}
+    refresh_tree_membership(affected | parents | old_parents)
+    return affected
+
+def rebuild_ancestry():
+    """Reconstrói o fechamento e as colunas de linhagem a partir de person (para dados já existentes)"""
+    bump_tree_version()
+    db.session.execute(PersonAncestry.__table__.delete())
+    rows = db.session.execute(db.select(Person.id, Person.father_id, Person.mother_id)).all()
+    closure, generations = _compute(rows, {}, {})
+    _write(closure)
+    # Pessoas presas em ciclos ficam sem geração
+    _write_generations({**{person_id: None for person_id, _, _ in rows}, **generations})
+    recount_descendants()
+    rebuild_tree_membership()
+    return sum(len(ancestors) for ancestors in closure.values())
+
+def is_ancestor(ancestor_id, person_id):
+    """Consulta indexada: ancestor_id é ancestral (ou a própria pessoa) de person_id?"""
+    if ancestor_id == person_id:
+        return True
+    return db.session.query(
+        db.exists().where(PersonAncestry.ancestor_id == ancestor_id, PersonAncestry.descendant_id == person_id)
+    ).scalar()
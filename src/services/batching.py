@@ -0,0 +1,14 @@
+"""Divisão de listas de ids em lotes para consultas ``IN``.
+
+O SQLite limita o número de parâmetros por instrução (999 nas versões
+antigas), então listas grandes são consultadas em pedaços de
+``SQL_CHUNK_SIZE``.
+"""
+
+SQL_CHUNK_SIZE = 500
+
+def chunks(values, size=SQL_CHUNK_SIZE):
+    """Gera listas de até ``size`` itens a partir de qualquer iterável"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
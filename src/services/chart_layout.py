@@ -0,0 +1,300 @@
+"""Layout de gráficos de pedigree e de descendência calculado no servidor.
+
+O gráfico é uma árvore enraizada na pessoa consultada: no pedigree os filhos
+de cada nó são o pai e a mãe, na descendência são os filhos da pessoa,
+agrupados pelo outro pai/mãe. A árvore genealógica é um DAG, então a mesma
+pessoa pode aparecer por mais de um caminho (casamento entre primos, o
+"pedigree collapse"). Ela é expandida só na ocorrência mais próxima da raiz;
+as demais viram folhas com ``duplicate_of`` apontando para o nó expandido, o
+que mantém o gráfico linear no número de pessoas.
+
+As coordenadas saem do algoritmo de Walker na versão linear de Buchheim,
+Jünger e Leipert (2002): ``x`` em unidades de espaçamento entre nós vizinhos
+(sempre >= 0) e ``y`` igual à distância em gerações até a raiz.
+
+Os layouts ficam num cache LRU por (raiz, tipo, profundidade, versão da árvore);
+toda escrita incrementa a versão, então uma entrada nunca fica desatualizada.
+"""
+import threading
+from collections import OrderedDict
+from src.database import db
+from src.models.person import Person
+from src.services.batching import chunks
+
+LAYOUT_TYPES = ('pedigree', 'descendants')
+DEFAULT_LAYOUT_DEPTH = {'pedigree': 4, 'descendants': 3}
+MAX_LAYOUT_DEPTH = 30
+MAX_LAYOUT_NODES = 20000
+# O cache é limitado pelo total de nós guardados, não pelo número de layouts
+LAYOUT_CACHE_NODES = 200000
+
+class LayoutTooLarge(Exception):
+    pass
+
+class _Node:
+    __slots__ = ('person_id', 'parent', 'children', 'number', 'level', 'duplicate_of', 'index',
+                 'x', 'mod', 'thread', 'ancestor', 'change', 'shift')
+
+    def __init__(self, person_id, parent=None, number=0):
+        self.person_id = person_id
+        self.parent = parent
+        self.children = []
+        self.number = number          # posição entre os irmãos
+        self.level = parent.level + 1 if parent else 0
+        self.duplicate_of = None
+        self.index = None
+        self.x = 0.0
+        self.mod = 0.0
+        self.thread = None
+        self.ancestor = self
+        self.change = 0.0
+        self.shift = 0.0
+
+    def left(self):
+        return self.thread or (self.children[0] if self.children else None)
+
+    def right(self):
+        return self.thread or (self.children[-1] if self.children else None)
+
+    def left_brother(self):
+        return self.parent.children[self.number - 1] if self.number else None
+
+    def leftmost_sibling(self):
+        return self.parent.children[0] if self.number else None
+
+# Buchheim, Jünger e Leipert, "Improving Walker's Algorithm to Run in Linear Time"
+
+def _first_walk(v, distance=1.0):
+    if not v.children:
+        brother = v.left_brother()
+        v.x = brother.x + distance if brother else 0.0
+        return
+    default_ancestor = v.children[0]
+    for child in v.children:
+        _first_walk(child, distance)
+        default_ancestor = _apportion(child, default_ancestor, distance)
+    _execute_shifts(v)
+    midpoint = (v.children[0].x + v.children[-1].x) / 2
+    brother = v.left_brother()
+    if brother:
+        v.x = brother.x + distance
+        v.mod = v.x - midpoint
+    else:
+        v.x = midpoint
+
+def _apportion(v, default_ancestor, distance):
+    brother = v.left_brother()
+    if brother is None:
+        return default_ancestor
+    inner_right = outer_right = v
+    inner_left = brother
+    outer_left = v.leftmost_sibling()
+    shift_inner_right = shift_outer_right = v.mod
+    shift_inner_left = inner_left.mod
+    shift_outer_left = outer_left.mod
+    while inner_left.right() and inner_right.left():
+        inner_left = inner_left.right()
+        inner_right = inner_right.left()
+        outer_left = outer_left.left()
+        outer_right = outer_right.right()
+        outer_right.ancestor = v
+        shift = (inner_left.x + shift_inner_left) - (inner_right.x + shift_inner_right) + distance
+        if shift > 0:
+            ancestor = inner_left.ancestor if inner_left.ancestor.parent is v.parent else default_ancestor
+            _move_subtree(ancestor, v, shift)
+            shift_inner_right += shift
+            shift_outer_right += shift
+        shift_inner_left += inner_left.mod
+        shift_inner_right += inner_right.mod
+        shift_outer_left += outer_left.mod
+        shift_outer_right += outer_right.mod
+    if inner_left.right() and not outer_right.right():
+        outer_right.thread = inner_left.right()
+        outer_right.mod += shift_inner_left - shift_outer_right
+    if inner_right.left() and not outer_left.left():
+        outer_left.thread = inner_right.left()
+        outer_left.mod += shift_inner_right - shift_outer_left
+        default_ancestor = v
+    return default_ancestor
+
+def _move_subtree(left, right, shift):
+    subtrees = right.number - left.number
+    right.change -= shift / subtrees
+    right.shift += shift
+    left.change += shift / subtrees
+    right.x += shift
+    right.mod += shift
+
+def _execute_shifts(v):
+    shift = change = 0.0
+    for child in reversed(v.children):
+        child.x += shift
+        child.mod += shift
+        change += child.change
+        shift += child.shift + change
+
+def _second_walk(root):
+    # Iterativo: acumula os modificadores dos ancestrais e devolve a menor coordenada
+    minimum = 0.0
+    stack = [(root, 0.0)]
+    while stack:
+        node, modifier = stack.pop()
+        node.x += modifier
+        minimum = min(minimum, node.x)
+        stack.extend((child, modifier + node.mod) for child in node.children)
+    return minimum
+
+def _build(graph, root_id, layout_type, depth):
+    """Monta a árvore do gráfico em largura: cada pessoa é expandida na ocorrência mais rasa"""
+    root = _Node(root_id)
+    nodes = [root]
+    expanded = {root_id: root}
+    level = [root]
+    for _ in range(depth):
+        next_level = []
+        for node in level:
+            if layout_type == 'pedigree':
+                related = [person_id for person_id in graph.parents(node.person_id) if person_id is not None]
+            else:
+                related = graph.children_of(node.person_id)
+            for person_id in related:
+                child = _Node(person_id, node, len(node.children))
+                node.children.append(child)
+                nodes.append(child)
+                if person_id in expanded:
+                    child.duplicate_of = expanded[person_id]
+                else:
+                    expanded[person_id] = child
+                    next_level.append(child)
+            if len(nodes) > MAX_LAYOUT_NODES:
+                raise LayoutTooLarge(f'The chart has more than {MAX_LAYOUT_NODES} nodes; use a smaller depth')
+        level = next_level
+    return nodes
+
+def _person_rows(person_ids):
+    persons = {}
+    for chunk in chunks(person_ids):
+        for row in db.session.execute(
+            db.select(Person.id, Person.name, Person.gender, Person.birth_year, Person.death_year,
+                      Person.father_id, Person.mother_id).where(Person.id.in_(chunk))
+        ):
+            persons[row.id] = row
+    return persons
+
+def _partner(person, parent_id):
+    # O outro pai/mãe de um filho em relação a ``parent_id``
+    if person.father_id == parent_id:
+        return person.mother_id
+    return person.father_id
+
+def compute_layout(graph, root_id, layout_type, depth):
+    """Calcula o layout sem cache; retorna o dicionário servido pela rota"""
+    nodes = _build(graph, root_id, layout_type, depth)
+    persons = _person_rows({node.person_id for node in nodes})
+
+    partners = {}
+    if layout_type == 'descendants':
+        # Filhos agrupados por casal, e dentro do casal por data de nascimento
+        for node in nodes:
+            if not node.children:
+                continue
+            order = {}
+            for child in node.children:
+                order.setdefault(_partner(persons[child.person_id], node.person_id), len(order))
+            node.children.sort(key=lambda child: (
+                order[_partner(persons[child.person_id], node.person_id)],
+                persons[child.person_id].birth_year is None,
+                persons[child.person_id].birth_year or 0,
+                child.person_id,
+            ))
+            for number, child in enumerate(node.children):
+                child.number = number
+            partners[node.person_id] = [partner_id for partner_id in order if partner_id is not None]
+        partner_names = {person_id: row.name for person_id, row in _person_rows(
+            {partner_id for ids in partners.values() for partner_id in ids} - set(persons)
+        ).items()}
+        partner_names.update((person_id, row.name) for person_id, row in persons.items())
+
+    # Pré-ordem: a raiz fica no índice 0 e cada nó antes dos seus filhos
+    ordered = []
+    stack = [nodes[0]]
+    while stack:
+        node = stack.pop()
+        node.index = len(ordered)
+        ordered.append(node)
+        stack.extend(reversed(node.children))
+
+    root = nodes[0]
+    _first_walk(root)
+    shift = -_second_walk(root)
+
+    items = []
+    for node in ordered:
+        person = persons[node.person_id]
+        item = {
+            'id': node.person_id,
+            'name': person.name,
+            'gender': person.gender,
+            'birth_year': person.birth_year,
+            'death_year': person.death_year,
+            'x': round(node.x + shift, 4),
+            'y': node.level,
+            'parent': node.parent.index if node.parent else None,
+            'duplicate_of': node.duplicate_of.index if node.duplicate_of else None,
+        }
+        if layout_type == 'descendants' and node.duplicate_of is None:
+            item['partners'] = [{'id': partner_id, 'name': partner_names.get(partner_id)}
+                                for partner_id in partners.get(node.person_id, ())]
+        items.append(item)
+    return {
+        'root_id': root_id,
+        'type': layout_type,
+        'depth': depth,
+        'width': max(item['x'] for item in items),
+        'height': max(item['y'] for item in items),
+        'nodes': items,
+    }
+
+class LayoutCache:
+    """Cache LRU de layouts por (raiz, tipo, profundidade, versão da árvore)"""
+
+    def __init__(self, max_nodes=LAYOUT_CACHE_NODES):
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            layout = self._entries.get(key)
+            if layout is not None:
+                self._entries.move_to_end(key)
+            return layout
+
+    def put(self, key, layout):
+        with self._lock:
+            version = key[-1]
+            if self.version is None or version > self.version:
+                # Entradas de versões anteriores não serão mais pedidas
+                self._entries.clear()
+                self.nodes = 0
+                self.version = version
+            elif version < self.version or key in self._entries:
+                return
+            self._entries[key] = layout
+            self.nodes += len(layout['nodes'])
+            while self.nodes > self.max_nodes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.nodes -= len(evicted['nodes'])
+
+_cache = LayoutCache()
+
+def get_layout(graph, root_id, layout_type, depth):
+    """Layout do gráfico de ``root_id``, do cache quando a árvore não mudou desde o cálculo"""
+    key = (root_id, layout_type, depth, graph.version)
+    layout = _cache.get(key)
+    if layout is None:
+        layout = compute_layout(graph, root_id, layout_type, depth)
+        _cache.put(key, layout)
+    return layout
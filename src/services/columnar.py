@@ -0,0 +1,88 @@
+"""Representação colunar da árvore para o visualizador (``/family-tree?format=columnar``).
+
+Em vez de um objeto por pessoa, cada campo vira um vetor paralelo e os pais
+são índices nesses vetores (-1 quando desconhecido ou fora do resultado).
+Nomes repetidos são guardados uma vez só em ``names``. Notas e demais campos
+ficam de fora: o cliente os busca sob demanda em ``/person/<id>``.
+
+Com ``encoding=binary`` os mesmos vetores vão num buffer compacto, legível
+direto com TypedArrays (todos os inteiros em little-endian, cada bloco
+alinhado ao tamanho do seu elemento):
+
+    cabeçalho  4s magic "FBT1", uint32 count, uint32 names_count, uint32 names_bytes
+    int32[count]   ids
+    int32[count]   father     (índice, -1 = nenhum)
+    int32[count]   mother
+    uint32[count]  name       (índice em names)
+    int16[count]   birth_year (0 = desconhecido)
+    int16[count]   death_year
+    int16[count]   generation (-1 = desconhecida)
+    uint8[count]   gender     (0 = desconhecido, 1 = M, 2 = F)
+    names_bytes    nomes em UTF-8 separados por "\\0"
+"""
+import struct
+import sys
+from array import array
+from src.database import db
+from src.models.person import Person
+
+COLUMNAR_MAGIC = b'FBT1'
+GENDER_CODES = {'M': 1, 'F': 2}
+
+def columnar_select():
+    """SELECT enxuto: só as colunas que o layout da árvore usa"""
+    return db.select(
+        Person.id, Person.name, Person.father_id, Person.mother_id, Person.gender,
+        Person.birth_year, Person.death_year, Person.generation
+    )
+
+def tree_columns(conditions=(), order_by=(Person.id,)):
+    """Vetores paralelos das pessoas que atendem ``conditions``"""
+    # Connection.execute pula o processamento de linhas do ORM, que dobraria o tempo da consulta
+    query = columnar_select().where(*conditions).order_by(*order_by)
+    return build_columns(db.session.connection().execute(query))
+
+def build_columns(rows):
+    """Monta os vetores paralelos a partir das tuplas de ``columnar_select``"""
+    rows = list(rows)
+    ids = [row[0] for row in rows]
+    index_of = {person_id: index for index, person_id in enumerate(ids)}
+    names = {}
+    name_indexes = [names.setdefault(row[1], len(names)) for row in rows]
+    return {
+        'count': len(rows),
+        'ids': ids,
+        'father': [index_of.get(row[2], -1) for row in rows],
+        'mother': [index_of.get(row[3], -1) for row in rows],
+        'names': list(names),
+        'name': name_indexes,
+        'gender': [GENDER_CODES.get(row[4], 0) for row in rows],
+        'birth_year': [row[5] for row in rows],
+        'death_year': [row[6] for row in rows],
+        'generation': [row[7] for row in rows],
+    }
+
+def _block(typecode, values):
+    block = array(typecode, values)
+    if sys.byteorder != 'little':
+        block.byteswap()
+    return block.tobytes()
+
+def _int16(values, missing):
+    return [value if value is not None and -32768 <= value <= 32767 else missing for value in values]
+
+def pack_columns(columns):
+    """Serializa ``build_columns`` no formato binário descrito no módulo"""
+    names = '\0'.join(columns['names']).encode('utf-8')
+    return b''.join((
+        struct.pack('<4sIII', COLUMNAR_MAGIC, columns['count'], len(columns['names']), len(names)),
+        _block('i', columns['ids']),
+        _block('i', columns['father']),
+        _block('i', columns['mother']),
+        _block('I', columns['name']),
+        _block('h', _int16(columns['birth_year'], 0)),
+        _block('h', _int16(columns['death_year'], 0)),
+        _block('h', _int16(columns['generation'], -1)),
+        _block('B', columns['gender']),
+        names,
+    ))
@@ -0,0 +1,57 @@
+"""Interpretação das datas livres de Person (birth_date/death_date).
+
+As datas são guardadas como texto ("1871-03-12", "1871-03", "1871",
+"12/03/1871", "03/1871"...). ``parse_partial_date`` extrai ano, mês e dia com a
+precisão conhecida para as colunas ordenáveis e indexadas de Person.
+"""
+import re
+from datetime import date
+
+ISO_DATE_RE = re.compile(r'^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+BR_DATE_RE = re.compile(r'^(?:(\d{1,2})/)?(\d{1,2})/(\d{4})$')
+YEAR_RE = re.compile(r'(?<!\d)(\d{4})(?!\d)')
+
+# Precisão da data interpretada
+PRECISION_DAY = 'day'
+PRECISION_MONTH = 'month'
+PRECISION_YEAR = 'year'
+PRECISION_APPROXIMATE = 'approximate'   # só um ano encontrado no meio do texto ("c. 1871", "antes de 1900")
+
+def parse_partial_date(value):
+    """Retorna (ano, mês, dia, precisão); campos desconhecidos são None"""
+    value = (value or '').strip()
+    match = ISO_DATE_RE.match(value)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = BR_DATE_RE.match(value)
+        if match:
+            day, month, year = match.groups()
+        else:
+            match = YEAR_RE.search(value)
+            if not match:
+                return None, None, None, None
+            return int(match.group(1)), None, None, PRECISION_APPROXIMATE
+
+    year = int(year)
+    month = int(month) if month else None
+    day = int(day) if day else None
+    if month is not None and not 1 <= month <= 12:
+        return year, None, None, PRECISION_YEAR
+    if day is not None:
+        try:
+            date(year, month, day)
+        except ValueError:
+            return year, month, None, PRECISION_MONTH
+        return year, month, day, PRECISION_DAY
+    return year, month, None, PRECISION_MONTH if month else PRECISION_YEAR
+
+def life_date_columns(prefix, value):
+    """Colunas ``<prefix>_year``/``_month``/``_day``/``_precision`` de Person para a data dada"""
+    year, month, day, precision = parse_partial_date(value)
+    return {
+        f'{prefix}_year': year,
+        f'{prefix}_month': month,
+        f'{prefix}_day': day,
+        f'{prefix}_precision': precision,
+    }
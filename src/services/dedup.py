@@ -0,0 +1,200 @@
+"""Detecção e fusão de pessoas duplicadas.
+
+Comparar todos os pares é O(n²); em vez disso cada pessoa recebe uma chave de
+bloco (código fonético do sobrenome + década de nascimento) e só pessoas do
+mesmo bloco são comparadas. Os blocos são pontuados em paralelo num pool de
+processos e os pares acima do limiar vão para ``DuplicateCandidate``.
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from functools import partial
+from src.database import db
+from src.models.person import Person, PersonAncestry, DuplicateCandidate
+from src.models.family_tree import ConnectionSuggestion, FamilyTree, UserPersonConnection, bump_tree_version
+from src.models.media import MediaFile
+from src.services.names import normalize_name, phonetic_key
+from src.services.ancestry import is_ancestor, refresh_ancestry, recount_descendants
+from src.services.person_graph import invalidate_person_graph
+from src.services.family_stats import person_stat_counts, update_family_stats
+
+DEDUP_MIN_SCORE = 0.8
+MAX_BLOCK_SIZE = 500
+YEAR_RE = re.compile(r'\d{4}')
+MERGE_FIELDS = (
+    'birth_date', 'birth_place', 'birth_place_id', 'death_date', 'death_place', 'death_place_id',
+    'gender', 'father_id', 'mother_id',
+)
+
+class MergeError(ValueError):
+    pass
+
+def birth_year(value):
+    match = YEAR_RE.search(value or '')
+    return int(match.group()) if match else None
+
+def blocking_key(name, year):
+    """Código fonético do sobrenome (última palavra) + década de nascimento"""
+    words = normalize_name(name).split()
+    surname = phonetic_key(words[-1]) if words else ''
+    decade = f'{year // 10 * 10}s' if year else '?'
+    return f'{surname}:{decade}'
+
+def score_pair(a, b):
+    """Pontua (0 a 1) duas pessoas no formato (id, nome, ano, local, gênero, pai, mãe)"""
+    _, name_a, year_a, place_a, gender_a, father_a, mother_a = a
+    _, name_b, year_b, place_b, gender_b, father_b, mother_b = b
+    if gender_a and gender_b and gender_a != gender_b:
+        return 0.0
+    if (father_a and father_b and father_a != father_b) or (mother_a and mother_b and mother_a != mother_b):
+        return 0.0
+
+    name_score = SequenceMatcher(None, name_a, name_b).ratio()
+    if year_a and year_b:
+        year_score = max(0.0, 1 - abs(year_a - year_b) / 5)
+    else:
+        year_score = 0.5
+    if place_a and place_b:
+        place_score = 1.0 if place_a in place_b or place_b in place_a else SequenceMatcher(None, place_a, place_b).ratio()
+    else:
+        place_score = 0.5
+
+    score = 0.6 * name_score + 0.25 * year_score + 0.15 * place_score
+    if (father_a and father_a == father_b) or (mother_a and mother_a == mother_b):
+        score += 0.1
+    return min(score, 1.0)
+
+def score_block(block, min_score=DEDUP_MIN_SCORE):
+    """Compara todos os pares de um bloco; roda nos processos do pool"""
+    key, persons = block
+    candidates = []
+    for i, a in enumerate(persons):
+        for b in persons[i + 1:]:
+            score = score_pair(a, b)
+            if score >= min_score:
+                candidates.append((a[0], b[0], round(score, 4), key))
+    return candidates
+
+def _blocks():
+    """Agrupa as pessoas por chave de bloco numa única leitura da tabela"""
+    blocks = {}
+    query = db.select(
+        Person.id, Person.name, Person.birth_date, Person.birth_place,
+        Person.gender, Person.father_id, Person.mother_id
+    ).execution_options(yield_per=5000)
+    for person_id, name, birth_date, birth_place, gender, father_id, mother_id in db.session.execute(query):
+        year = birth_year(birth_date)
+        normalized = normalize_name(name)
+        blocks.setdefault(blocking_key(name, year), []).append(
+            (person_id, normalized, year, normalize_name(birth_place), gender, father_id, mother_id)
+        )
+
+    for key, persons in blocks.items():
+        if len(persons) < 2:
+            continue
+        if len(persons) <= MAX_BLOCK_SIZE:
+            yield key, persons
+            continue
+        # Blocos grandes demais são divididos pelo código fonético do primeiro nome
+        sub_blocks = {}
+        for person in persons:
+            first = person[1].split()[0] if person[1] else ''
+            sub_blocks.setdefault(phonetic_key(first), []).append(person)
+        for first_key, sub_persons in sub_blocks.items():
+            if len(sub_persons) >= 2:
+                yield f'{key}:{first_key}', sub_persons
+
+def find_duplicates(workers=None, min_score=DEDUP_MIN_SCORE):
+    """Recalcula a tabela de candidatos a duplicata; retorna o número de pares"""
+    blocks = list(_blocks())
+    scorer = partial(score_block, min_score=min_score)
+    if workers == 1 or len(blocks) < 2:
+        results = map(scorer, blocks)
+        candidates = [candidate for result in results for candidate in result]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(scorer, blocks, chunksize=64)
+            candidates = [candidate for result in results for candidate in result]
+
+    db.session.execute(DuplicateCandidate.__table__.delete())
+    if candidates:
+        db.session.execute(DuplicateCandidate.__table__.insert(), [
+            {'person_a_id': a, 'person_b_id': b, 'score': score, 'block_key': key}
+            for a, b, score, key in candidates
+        ])
+    return len(candidates)
+
+def merge_persons(keep, remove):
+    """Funde ``remove`` em ``keep`` numa única transação.
+
+    Filhos, conexões de usuários, sugestões de conexão, arquivos de mídia e raízes
+    de árvores passam a apontar para ``keep``; campos vazios de ``keep`` são completados com os de
+    ``remove``, que é então apagado.
+    """
+    if keep.id == remove.id:
+        raise MergeError('Cannot merge a person with itself')
+    if is_ancestor(keep.id, remove.id) or is_ancestor(remove.id, keep.id):
+        raise MergeError('Cannot merge a person with their own ancestor or descendant')
+
+    bump_tree_version()
+    stats_before = person_stat_counts([keep.id, remove.id])
+    for field in MERGE_FIELDS:
+        if getattr(keep, field) is None and getattr(remove, field) is not None:
+            setattr(keep, field, getattr(remove, field))
+    # Notas repetidas (ex.: fusões em cadeia ou registros importados duas vezes) não são duplicadas
+    if remove.notes and remove.notes not in (keep.notes or ''):
+        keep.notes = f'{keep.notes}\n\n{remove.notes}' if keep.notes else remove.notes
+
+    # Ancestrais de ``remove`` perdem um descendente
+    old_ancestors = set(db.session.execute(
+        db.select(PersonAncestry.ancestor_id).where(PersonAncestry.descendant_id == remove.id)
+    ).scalars())
+    child_ids = list(db.session.execute(
+        db.select(Person.id).where((Person.father_id == remove.id) | (Person.mother_id == remove.id))
+    ).scalars())
+
+    person_table = Person.__table__
+    row_version = person_table.c.row_version + 1
+    db.session.execute(person_table.update().where(person_table.c.father_id == remove.id).values(
+        father_id=keep.id, row_version=row_version))
+    db.session.execute(person_table.update().where(person_table.c.mother_id == remove.id).values(
+        mother_id=keep.id, row_version=row_version))
+
+    # Usuários já conectados às duas pessoas ficam só com a conexão de ``keep``
+    connected = db.select(UserPersonConnection.user_id).where(UserPersonConnection.person_id == keep.id)
+    db.session.execute(db.delete(UserPersonConnection).where(
+        UserPersonConnection.person_id == remove.id, UserPersonConnection.user_id.in_(connected)
+    ))
+    db.session.execute(db.update(UserPersonConnection).where(
+        UserPersonConnection.person_id == remove.id).values(person_id=keep.id))
+    # Sugestões que repetiriam uma de ``keep`` (mesmo usuário e parentesco) são descartadas
+    keep_suggestion = db.aliased(ConnectionSuggestion)
+    db.session.execute(db.delete(ConnectionSuggestion).where(
+        ConnectionSuggestion.person_id == remove.id,
+        db.select(keep_suggestion.id).where(
+            keep_suggestion.person_id == keep.id,
+            keep_suggestion.user_id == ConnectionSuggestion.user_id,
+            keep_suggestion.relationship_type == ConnectionSuggestion.relationship_type
+        ).exists()
+    ))
+    db.session.execute(db.update(ConnectionSuggestion).where(
+        ConnectionSuggestion.person_id == remove.id).values(person_id=keep.id))
+    db.session.execute(db.update(MediaFile).where(MediaFile.person_id == remove.id).values(person_id=keep.id))
+    db.session.execute(db.update(FamilyTree).where(FamilyTree.root_person_id == remove.id).values(root_person_id=keep.id))
+    db.session.execute(db.delete(DuplicateCandidate).where(
+        (DuplicateCandidate.person_a_id == remove.id) | (DuplicateCandidate.person_b_id == remove.id)
+    ))
+    db.session.execute(db.delete(PersonAncestry).where(
+        (PersonAncestry.ancestor_id == remove.id) | (PersonAncestry.descendant_id == remove.id)
+    ))
+    remove_id = remove.id
+    db.session.expunge(remove)
+    db.session.execute(person_table.delete().where(person_table.c.id == remove_id))
+
+    db.session.flush()
+    refresh_ancestry([keep.id, *child_ids])
+    recount_descendants(old_ancestors)
+    update_family_stats(removed=stats_before, added=person_stat_counts([keep.id]), lineage=True, users=True)
+    db.session.commit()
+    invalidate_person_graph()
+    return keep
@@ -0,0 +1,148 @@
+"""Manutenção do snapshot ``family_stats`` lido por /statistics.
+
+As escritas em Person chamam ``update_family_stats`` na mesma transação com
+as contagens (gênero, século de nascimento, local de nascimento) das linhas
+antes e depois da alteração; o snapshot recebe só a diferença. Contagens
+que não se prestam a delta (número de gerações, maior ramo, usuários
+conectados) são relidas por índice quando a escrita pode tê-las alterado.
+
+``reconcile_family_stats`` recalcula tudo do zero (job periódico e
+primeira leitura de um banco sem snapshot).
+"""
+from collections import Counter
+from datetime import datetime
+from src.database import db
+from src.models.person import Person, PersonAncestry
+from src.models.place import Place
+from src.models.family_tree import FamilyStats, UserPersonConnection
+from src.services.batching import chunks
+
+TOP_PLACES = 20
+
+def _stat_query():
+    century = db.case((Person.birth_year.is_(None), None), else_=Person.birth_year // 100 * 100)
+    return db.select(Person.gender, century, Person.birth_place_id, db.func.count()).group_by(
+        Person.gender, century, Person.birth_place_id
+    )
+
+def _accumulate(counts, rows):
+    for gender, century, place_id, count in rows:
+        counts['gender'][gender if gender in ('M', 'F') else 'unknown'] += count
+        counts['century'][str(century) if century is not None else 'unknown'] += count
+        if place_id is not None:
+            counts['birth_place'][str(place_id)] += count
+        counts['total'] += count
+
+def person_stat_counts(person_ids=None, min_id=None, tree_id=None):
+    """Contagens por gênero/século/local das pessoas dadas (por ids, a partir de ``min_id``, da árvore ``tree_id`` ou todas)"""
+    counts = {'gender': Counter(), 'century': Counter(), 'birth_place': Counter(), 'total': 0}
+    connection = db.session.connection()
+    if person_ids is not None:
+        for chunk in chunks(person_ids):
+            _accumulate(counts, connection.execute(_stat_query().where(Person.id.in_(chunk))))
+    elif min_id is not None:
+        _accumulate(counts, connection.execute(_stat_query().where(Person.id >= min_id)))
+    elif tree_id is not None:
+        _accumulate(counts, connection.execute(_stat_query().where(Person.tree_id == tree_id)))
+    else:
+        _accumulate(counts, connection.execute(_stat_query()))
+    return counts
+
+def _apply(current, removed, added):
+    result = Counter(current)
+    if removed:
+        result.subtract(removed)
+    if added:
+        result.update(added)
+    return {key: value for key, value in result.items() if value > 0}
+
+def _top_birth_places(by_birth_place):
+    top = sorted(by_birth_place.items(), key=lambda item: (-item[1], int(item[0])))[:TOP_PLACES]
+    names = dict(db.session.execute(
+        db.select(Place.id, Place.name).where(Place.id.in_([int(place_id) for place_id, _ in top]))
+    ).all())
+    return [{'id': int(place_id), 'name': names.get(int(place_id)), 'count': count} for place_id, count in top]
+
+def _refresh_lineage(stats):
+    max_generation = db.session.query(db.func.max(Person.generation)).scalar()
+    stats.generations = max_generation + 1 if max_generation is not None else 0
+    largest_branch = db.session.execute(
+        db.select(Person.id, Person.descendant_count)
+        .where(Person.generation == 0).order_by(Person.descendant_count.desc(), Person.id).limit(1)
+    ).first()
+    stats.largest_branch_id, stats.largest_branch_descendant_count = largest_branch or (None, None)
+
+def _refresh_users(stats):
+    stats.total_users = db.session.query(UserPersonConnection.user_id).distinct().count()
+
+def update_family_stats(removed=None, added=None, lineage=False, users=False):
+    """Aplica ao snapshot a diferença entre as contagens ``removed`` e ``added`` (de ``person_stat_counts``).
+
+    ``lineage`` relê gerações e maior ramo; ``users`` reconta os usuários conectados.
+    Deve ser chamada dentro da transação da escrita, depois do flush.
+    """
+    stats = db.session.get(FamilyStats, 1)
+    if stats is None:
+        # Sem snapshot ainda: a reconciliação já enxerga a escrita corrente
+        reconcile_family_stats()
+        return
+    if removed or added:
+        removed = removed or {}
+        added = added or {}
+        stats.total_persons += added.get('total', 0) - removed.get('total', 0)
+        stats.by_gender = _apply(stats.by_gender, removed.get('gender'), added.get('gender'))
+        stats.by_century = _apply(stats.by_century, removed.get('century'), added.get('century'))
+        by_birth_place = _apply(stats.by_birth_place, removed.get('birth_place'), added.get('birth_place'))
+        if by_birth_place != stats.by_birth_place:
+            stats.by_birth_place = by_birth_place
+            stats.top_birth_places = _top_birth_places(by_birth_place)
+    if lineage:
+        _refresh_lineage(stats)
+    if users:
+        _refresh_users(stats)
+    stats.updated_at = datetime.utcnow()
+
+def reconcile_family_stats():
+    """Recalcula o snapshot inteiro a partir das tabelas"""
+    stats = db.session.get(FamilyStats, 1)
+    if stats is None:
+        stats = FamilyStats(id=1)
+        db.session.add(stats)
+    counts = person_stat_counts()
+    stats.total_persons = counts['total']
+    stats.by_gender = dict(counts['gender'])
+    stats.by_century = dict(counts['century'])
+    stats.by_birth_place = dict(counts['birth_place'])
+    stats.top_birth_places = _top_birth_places(stats.by_birth_place)
+    _refresh_lineage(stats)
+    _refresh_users(stats)
+    stats.updated_at = stats.reconciled_at = datetime.utcnow()
+    db.session.flush()
+    return stats
+
+def tree_stats(tree):
+    """Estatísticas de uma FamilyTree, calculadas só sobre as linhas dela (índice de tree_id)"""
+    counts = person_stat_counts(tree_id=tree.id)
+    total_users = db.session.execute(
+        db.select(db.func.count(db.distinct(UserPersonConnection.user_id)))
+        .join(Person, Person.id == UserPersonConnection.person_id).where(Person.tree_id == tree.id)
+    ).scalar()
+    root = db.session.get(Person, tree.root_person_id) if tree.root_person_id is not None else None
+    # Profundidade da descendência da raiz, pela chave primária do fechamento
+    depth = db.session.execute(
+        db.select(db.func.max(PersonAncestry.distance)).where(PersonAncestry.ancestor_id == root.id)
+    ).scalar() if root else None
+    return {
+        'tree_id': tree.id,
+        'total_persons': counts['total'],
+        'total_users': total_users,
+        'generations': (depth or 0) + 1 if root else 0,
+        'root': {
+            'id': root.id,
+            'name': root.name,
+            'descendant_count': root.descendant_count
+        } if root else None,
+        'by_gender': dict(counts['gender']),
+        'by_century': dict(counts['century']),
+        'top_birth_places': _top_birth_places(counts['birth_place']),
+    }
@@ -0,0 +1,120 @@
+"""Pertinência das pessoas às árvores de família (``Person.tree_id``).
+
+Cada FamilyTree é definida pela sua pessoa raiz. Pertencem à árvore a raiz,
+os descendentes dela (lidos da tabela de fechamento) e quem entrou na família
+por casamento, isto é, o pai ou a mãe de um descendente que não descende da
+raiz (os pais da própria raiz ficam de fora). Uma pessoa que cai em mais de uma árvore fica com a de menor id; a
+descendência direta tem prioridade sobre o casamento.
+
+``refresh_tree_membership`` é chamada por ``refresh_ancestry`` sempre que pais
+mudam. ``rebuild_tree_membership`` recalcula tudo e é usada quando árvores são
+criadas ou trocam de raiz.
+"""
+from src.database import db
+from src.models.person import Person, PersonAncestry
+from src.models.family_tree import FamilyTree
+from src.services.batching import chunks
+
+UPDATE_BATCH_SIZE = 5000
+
+def _roots():
+    """[(id da raiz, id da árvore)] em ordem de id da árvore"""
+    return db.session.execute(
+        db.select(FamilyTree.root_person_id, FamilyTree.id)
+        .where(FamilyTree.root_person_id.is_not(None)).order_by(FamilyTree.id)
+    ).all()
+
+def _direct_trees(person_ids, roots, include_roots=True):
+    # Uma busca pela chave primária (ancestor_id, descendant_id) por raiz: o custo
+    # não depende de quantos ancestrais cada pessoa tem
+    person_ids = set(person_ids)
+    trees = {}
+    for root_id, tree_id in roots:
+        if include_roots and root_id in person_ids:
+            trees.setdefault(root_id, tree_id)
+        for chunk in chunks(person_ids):
+            for person_id in db.session.execute(
+                db.select(PersonAncestry.descendant_id)
+                .where(PersonAncestry.ancestor_id == root_id, PersonAncestry.descendant_id.in_(chunk))
+            ).scalars():
+                trees.setdefault(person_id, tree_id)
+    return trees
+
+def _write(trees, person_ids):
+    """Grava ``trees`` nas pessoas dadas; quem não está em ``trees`` fica sem árvore"""
+    person_table = Person.__table__
+    changes = []
+    for chunk in chunks(person_ids):
+        for person_id, tree_id in db.session.execute(
+            db.select(person_table.c.id, person_table.c.tree_id).where(person_table.c.id.in_(chunk))
+        ):
+            if trees.get(person_id) != tree_id:
+                changes.append({'person_id': person_id, 'new_tree_id': trees.get(person_id)})
+    statement = person_table.update().where(person_table.c.id == db.bindparam('person_id')).values(
+        tree_id=db.bindparam('new_tree_id'), row_version=person_table.c.row_version + 1
+    )
+    for start in range(0, len(changes), UPDATE_BATCH_SIZE):
+        db.session.execute(statement, changes[start:start + UPDATE_BATCH_SIZE])
+    return len(changes)
+
+def refresh_tree_membership(person_ids):
+    """Recalcula a árvore das pessoas dadas, dentro da transação corrente.
+
+    O chamador inclui os pais (antigos e novos) das pessoas cujos pais mudaram:
+    a árvore de quem entrou por casamento depende da árvore dos filhos.
+    """
+    person_ids = set(person_ids)
+    roots = _roots()
+    if not roots or not person_ids:
+        return 0
+    trees = _direct_trees(person_ids, roots)
+
+    married_in = person_ids - set(trees)
+    children = {}
+    for chunk in chunks(married_in):
+        for child_id, father_id, mother_id in db.session.execute(
+            db.select(Person.id, Person.father_id, Person.mother_id)
+            .where(Person.father_id.in_(chunk) | Person.mother_id.in_(chunk))
+        ):
+            for parent_id in (father_id, mother_id):
+                if parent_id in married_in:
+                    children.setdefault(parent_id, []).append(child_id)
+    child_ids = {child_id for child_ids in children.values() for child_id in child_ids}
+    child_trees = _direct_trees(child_ids, roots, include_roots=False)
+    for parent_id, child_ids in children.items():
+        candidates = [child_trees[child_id] for child_id in child_ids if child_id in child_trees]
+        if candidates:
+            trees[parent_id] = min(candidates)
+    return _write(trees, person_ids)
+
+def rebuild_tree_membership():
+    """Recalcula ``tree_id`` de todas as pessoas; retorna quantas linhas mudaram"""
+    roots = _roots()
+    descendants = {}
+    for root_id, tree_id in roots:
+        for person_id in db.session.execute(
+            db.select(PersonAncestry.descendant_id).where(PersonAncestry.ancestor_id == root_id)
+        ).scalars():
+            descendants.setdefault(person_id, tree_id)
+    trees = dict(descendants)
+    for root_id, tree_id in roots:
+        trees[root_id] = min(tree_id, trees.get(root_id, tree_id))
+
+    direct = dict(trees)
+    for chunk in chunks(descendants):
+        for person_id, father_id, mother_id in db.session.execute(
+            db.select(Person.id, Person.father_id, Person.mother_id).where(Person.id.in_(chunk))
+        ):
+            for parent_id in (father_id, mother_id):
+                if parent_id is not None and parent_id not in direct:
+                    tree_id = descendants[person_id]
+                    trees[parent_id] = min(tree_id, trees.get(parent_id, tree_id))
+
+    current = db.session.execute(db.select(Person.id).where(Person.tree_id.is_not(None))).scalars()
+    return _write(trees, set(current) | set(trees))
+
+def tree_member_counts():
+    """{id da árvore: número de pessoas}, pelo índice de tree_id"""
+    return dict(db.session.execute(
+        db.select(Person.tree_id, db.func.count()).where(Person.tree_id.is_not(None)).group_by(Person.tree_id)
+    ).all())
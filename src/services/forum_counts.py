@@ -0,0 +1,54 @@
+"""Reconciliação dos contadores desnormalizados do fórum.
+
+As rotas de escrita mantêm ``ForumCategory.topic_count``/``post_count`` e
+``ForumTopic.posts_count`` na mesma transação de cada tópico ou postagem. Esta
+rotina os recalcula a partir das tabelas (após importações, correções manuais
+ou na migração que criou as colunas) e só grava as linhas que divergem.
+"""
+from src.database import db
+from src.models.forum import ForumCategory, ForumTopic, ForumPost
+
+def reconcile_forum_counts():
+    """Recalcula os contadores; retorna quantas categorias e tópicos foram corrigidos"""
+    # Uma passagem agrupada por tabela em vez de uma contagem por linha
+    posts_by_topic = dict(db.session.execute(
+        db.select(ForumPost.topic_id, db.func.count()).group_by(ForumPost.topic_id)
+    ).all())
+    topic_rows = db.session.execute(
+        db.select(ForumTopic.id, ForumTopic.category_id, ForumTopic.posts_count)
+    ).all()
+
+    topics_by_category = {}
+    posts_by_category = {}
+    topic_changes = []
+    for topic_id, category_id, posts_count in topic_rows:
+        count = posts_by_topic.get(topic_id, 0)
+        topics_by_category[category_id] = topics_by_category.get(category_id, 0) + 1
+        posts_by_category[category_id] = posts_by_category.get(category_id, 0) + count
+        if posts_count != count:
+            topic_changes.append({'topic_id': topic_id, 'new_count': count})
+
+    category_changes = [
+        {'category_id': category_id, 'new_topics': topics_by_category.get(category_id, 0),
+         'new_posts': posts_by_category.get(category_id, 0)}
+        for category_id, topic_count, post_count in db.session.execute(
+            db.select(ForumCategory.id, ForumCategory.topic_count, ForumCategory.post_count)
+        )
+        if (topic_count, post_count) != (topics_by_category.get(category_id, 0), posts_by_category.get(category_id, 0))
+    ]
+
+    topic_table = ForumTopic.__table__
+    category_table = ForumCategory.__table__
+    if topic_changes:
+        db.session.execute(
+            topic_table.update().where(topic_table.c.id == db.bindparam('topic_id'))
+            .values(posts_count=db.bindparam('new_count')),
+            topic_changes
+        )
+    if category_changes:
+        db.session.execute(
+            category_table.update().where(category_table.c.id == db.bindparam('category_id'))
+            .values(topic_count=db.bindparam('new_topics'), post_count=db.bindparam('new_posts')),
+            category_changes
+        )
+    return {'categories': len(category_changes), 'topics': len(topic_changes)}
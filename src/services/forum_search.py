@@ -0,0 +1,147 @@
+"""Busca de texto completo no fórum com SQLite FTS5.
+
+Tópicos (título e conteúdo) e postagens ficam nas tabelas FTS5
+``forum_topic_fts`` e ``forum_post_fts``, com conteúdo externo nas próprias
+tabelas do fórum e mantidas por triggers, como ``person_name_fts``. O
+tokenizador ``unicode61 remove_diacritics 2`` ignora maiúsculas e acentos
+("emigração" acha "emigracao", "città" acha "citta"), o que serve ao português
+e ao italiano.
+
+A consulta do usuário vira termos entre aspas combinados com AND, e a última
+palavra vira prefixo para a busca funcionar enquanto se digita. Os resultados
+saem ordenados pelo BM25 (o título pesa mais que o conteúdo) com trechos
+destacados por ``snippet``.
+"""
+import html
+import re
+from sqlalchemy.orm import joinedload
+from src.database import db
+from src.models.forum import ForumTopic, ForumPost
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 50
+SNIPPET_TOKENS = 16
+TITLE_WEIGHT = 5.0
+# Marcadores de uso privado trocados por <mark> depois de escapar o texto
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = '\ue000', '\ue001'
+WORD_RE = re.compile(r'\w+')
+
+FORUM_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS forum_topic_fts USING fts5("
+    "title, content, content='forum_topic', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS forum_topic_fts_ai AFTER INSERT ON forum_topic BEGIN "
+    "INSERT INTO forum_topic_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS forum_topic_fts_ad AFTER DELETE ON forum_topic BEGIN "
+    "INSERT INTO forum_topic_fts(forum_topic_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS forum_topic_fts_au AFTER UPDATE OF title, content ON forum_topic BEGIN "
+    "INSERT INTO forum_topic_fts(forum_topic_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO forum_topic_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS forum_post_fts USING fts5("
+    "content, content='forum_post', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS forum_post_fts_ai AFTER INSERT ON forum_post BEGIN "
+    "INSERT INTO forum_post_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS forum_post_fts_ad AFTER DELETE ON forum_post BEGIN "
+    "INSERT INTO forum_post_fts(forum_post_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS forum_post_fts_au AFTER UPDATE OF content ON forum_post BEGIN "
+    "INSERT INTO forum_post_fts(forum_post_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO forum_post_fts(rowid, content) VALUES (new.id, new.content); END",
+)
+FORUM_SEARCH_TRIGGERS = (
+    'forum_topic_fts_ai', 'forum_topic_fts_ad', 'forum_topic_fts_au',
+    'forum_post_fts_ai', 'forum_post_fts_ad', 'forum_post_fts_au',
+)
+
+def _create_forum_search_index():
+    connection = db.session.connection()
+    for statement in FORUM_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO forum_topic_fts(forum_topic_fts) VALUES ('rebuild')")
+    connection.exec_driver_sql("INSERT INTO forum_post_fts(forum_post_fts) VALUES ('rebuild')")
+
+def ensure_forum_search_index():
+    """Cria e preenche os índices do fórum se ainda não existirem"""
+    existing = {row[0] for row in db.session.connection().exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('forum_topic_fts', 'forum_post_fts')"
+    )}
+    if len(existing) < 2:
+        _create_forum_search_index()
+        db.session.commit()
+
+def rebuild_forum_search_index():
+    """Recria os índices do fórum a partir de forum_topic e forum_post"""
+    connection = db.session.connection()
+    for trigger in FORUM_SEARCH_TRIGGERS:
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+    connection.exec_driver_sql('DROP TABLE IF EXISTS forum_topic_fts')
+    connection.exec_driver_sql('DROP TABLE IF EXISTS forum_post_fts')
+    _create_forum_search_index()
+
+def match_query(query):
+    """Expressão MATCH segura a partir do texto digitado (None se não houver palavras)"""
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' AND '.join(terms)
+
+def _highlight(snippet):
+    return html.escape(snippet or '').replace(HIGHLIGHT_OPEN, '<mark>').replace(HIGHLIGHT_CLOSE, '</mark>')
+
+def _snippet(table, column):
+    return f"snippet({table}, {column}, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '…', {SNIPPET_TOKENS})"
+
+def search_forum(query, page=1, per_page=SEARCH_PAGE_SIZE):
+    """Tópicos e postagens que casam com ``query``, ordenados pelo BM25, paginados.
+
+    Retorna {'topics': [...], 'posts': [...], 'has_more_topics', 'has_more_posts'};
+    cada item é o to_dict do modelo com ``score`` e os trechos destacados em HTML.
+    """
+    match = match_query(query)
+    if match is None:
+        return {'topics': [], 'posts': [], 'has_more_topics': False, 'has_more_posts': False}
+    params = {'match': match, 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+
+    # bm25() devolve valores negativos: quanto menor, mais relevante
+    topic_rows = db.session.execute(db.text(
+        f"SELECT rowid, bm25(forum_topic_fts, {TITLE_WEIGHT}, 1.0) AS score, "
+        f"{_snippet('forum_topic_fts', 0)}, {_snippet('forum_topic_fts', 1)} "
+        "FROM forum_topic_fts WHERE forum_topic_fts MATCH :match ORDER BY score LIMIT :limit OFFSET :offset"
+    ), params).all()
+    post_rows = db.session.execute(db.text(
+        f"SELECT rowid, bm25(forum_post_fts) AS score, {_snippet('forum_post_fts', 0)} "
+        "FROM forum_post_fts WHERE forum_post_fts MATCH :match ORDER BY score LIMIT :limit OFFSET :offset"
+    ), params).all()
+
+    topic_ids = [row[0] for row in topic_rows[:per_page]]
+    post_ids = [row[0] for row in post_rows[:per_page]]
+    topics = {topic.id: topic for topic in ForumTopic.query.options(
+        joinedload(ForumTopic.user), joinedload(ForumTopic.last_post_user)
+    ).filter(ForumTopic.id.in_(topic_ids))} if topic_ids else {}
+    posts = {post.id: post for post in ForumPost.query.options(
+        joinedload(ForumPost.user), joinedload(ForumPost.topic)
+    ).filter(ForumPost.id.in_(post_ids))} if post_ids else {}
+
+    topic_results = []
+    for topic_id, score, title_snippet, content_snippet in topic_rows[:per_page]:
+        if topic_id in topics:
+            topic_results.append(dict(
+                topics[topic_id].to_dict(), score=round(-score, 4),
+                title_highlight=_highlight(title_snippet), content_highlight=_highlight(content_snippet)
+            ))
+    post_results = []
+    for post_id, score, content_snippet in post_rows[:per_page]:
+        if post_id in posts:
+            post = posts[post_id]
+            post_results.append(dict(
+                post.to_dict(), score=round(-score, 4), topic_title=post.topic.title,
+                content_highlight=_highlight(content_snippet)
+            ))
+    return {
+        'topics': topic_results,
+        'posts': post_results,
+        'has_more_topics': len(topic_rows) > per_page,
+        'has_more_posts': len(post_rows) > per_page,
+    }
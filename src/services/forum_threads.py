@@ -0,0 +1,112 @@
+"""Paginação das postagens de um tópico do fórum.
+
+As postagens seguem a ordem (created_at, id), coberta pelo índice
+``ix_forum_post_topic_created`` em (topic_id, created_at, id). Há dois modos:
+
+- ``page``: o total de páginas vem de um COUNT coberto pelo índice, e não de
+  ``ForumTopic.posts_count``, que pode divergir até o próximo
+  ``reconcile-forum-counts`` e faria as páginas se sobreporem. Páginas da
+  segunda metade do tópico são lidas de trás para frente, então a última
+  página é uma busca no índice a partir do fim e não um OFFSET que percorre o
+  tópico inteiro;
+- ``after``: continua depois de uma postagem (a última já exibida), uma busca
+  por chave que custa o mesmo em qualquer ponto do tópico.
+
+Os nomes dos autores vêm numa única consulta ``IN`` por página e ficam num
+cache LRU deste worker, compartilhado entre páginas e tópicos. Sem parâmetros
+de paginação a rota devolve o tópico inteiro (``all_posts``), como antes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from src.database import db
+from src.models.forum import ForumPost
+from src.models.user import User
+
+DEFAULT_POSTS_PAGE_SIZE = 20
+MAX_POSTS_PAGE_SIZE = 100
+AUTHOR_CACHE_SIZE = 5000
+AUTHOR_CACHE_TTL = 300  # segundos
+
+class AuthorCache:
+    """Cache LRU de nomes de usuários com validade de ``ttl`` segundos"""
+
+    def __init__(self, max_size=AUTHOR_CACHE_SIZE, ttl=AUTHOR_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def names(self, user_ids):
+        """Nomes de ``user_ids``; os que faltam no cache vêm numa consulta só"""
+        now = time.monotonic()
+        names = {}
+        with self._lock:
+            for user_id in set(user_ids):
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    names[user_id] = entry[0]
+        missing = set(user_ids) - set(names)
+        if missing:
+            loaded = dict(db.session.execute(db.select(User.id, User.name).where(User.id.in_(missing))).all())
+            names.update(loaded)
+            with self._lock:
+                for user_id, name in loaded.items():
+                    self._entries[user_id] = (name, now + self.ttl)
+                    self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return names
+
+_authors = AuthorCache()
+
+def count_posts(topic):
+    """Número de postagens do tópico, contado no índice (topic_id, created_at, id)"""
+    return db.session.execute(
+        db.select(db.func.count()).select_from(ForumPost).where(ForumPost.topic_id == topic.id)
+    ).scalar()
+
+def page_count(total, per_page):
+    return max(1, -(-total // per_page))
+
+def _ordered(query, descending=False):
+    if descending:
+        return query.order_by(ForumPost.created_at.desc(), ForumPost.id.desc())
+    return query.order_by(ForumPost.created_at.asc(), ForumPost.id.asc())
+
+def all_posts(topic):
+    """Todas as postagens do tópico, na ordem do índice"""
+    return _ordered(ForumPost.query.filter(ForumPost.topic_id == topic.id)).all()
+
+def posts_page(topic, page, per_page, total):
+    """Postagens da página ``page`` (a partir de 1) de um tópico com ``total`` postagens,
+    lendo pelo lado mais próximo"""
+    start = (page - 1) * per_page
+    end = min(page * per_page, total)
+    query = ForumPost.query.filter(ForumPost.topic_id == topic.id)
+    if start >= end:
+        return []
+    if start <= total - end:
+        return _ordered(query).offset(start).limit(per_page).all()
+    # Segunda metade: de trás para frente, o OFFSET conta só as postagens depois da página
+    posts = _ordered(query, descending=True).offset(total - end).limit(end - start).all()
+    posts.reverse()
+    return posts
+
+def posts_after(topic, post, per_page):
+    """Até ``per_page`` postagens seguintes a ``post`` e se ainda há outras depois delas"""
+    # Uma linha a mais diz se existe página seguinte
+    posts = _ordered(ForumPost.query.filter(
+        ForumPost.topic_id == topic.id,
+        db.or_(
+            ForumPost.created_at > post.created_at,
+            db.and_(ForumPost.created_at == post.created_at, ForumPost.id > post.id)
+        )
+    )).limit(per_page + 1).all()
+    return posts[:per_page], len(posts) > per_page
+
+def posts_to_dicts(posts):
+    """Serializa as postagens com os nomes dos autores em lote (sem carga preguiçosa de ``user``)"""
+    names = _authors.names([post.user_id for post in posts])
+    return [post.to_dict(user_name=names.get(post.user_id)) for post in posts]
@@ -0,0 +1,96 @@
+"""Contagem de visualizações de tópicos do fórum em buffer.
+
+Ler um tópico não escreve no banco: ``record_view`` só soma a visualização
+num contador em memória deste worker. Uma thread de fundo grava o buffer a
+cada ``FLUSH_INTERVAL`` segundos com um único executemany de
+``UPDATE forum_topic SET views_count = views_count + ?``; o incremento em SQL
+soma corretamente as visualizações de todos os workers, sem a perda de
+atualizações do antigo ``topic.views_count += 1``.
+
+Visualizações ainda no buffer se perdem se o processo morrer sem passar pelo
+``atexit``; para um contador de visualizações a troca compensa.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from sqlalchemy.exc import SQLAlchemyError
+from src.database import db
+from src.models.forum import ForumTopic
+
+FLUSH_INTERVAL = 10  # segundos
+# Tópicos lembrados por sessão para não contar a mesma pessoa duas vezes
+SESSION_VIEWED_LIMIT = 200
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()
+_lock = threading.Lock()
+_flusher = None
+
+def pending_views(topic_id):
+    """Visualizações deste worker ainda não gravadas"""
+    with _lock:
+        return _pending.get(topic_id, 0)
+
+def record_view(app, topic_id, session=None):
+    """Conta uma visualização; com ``session`` (a sessão do Flask) cada sessão conta uma vez.
+
+    Retorna se a visualização foi contada.
+    """
+    if session is not None:
+        viewed = session.get('viewed_topics', [])
+        if topic_id in viewed:
+            return False
+        session['viewed_topics'] = (viewed + [topic_id])[-SESSION_VIEWED_LIMIT:]
+    with _lock:
+        _pending[topic_id] += 1
+    _start_flusher(app)
+    return True
+
+def flush_views():
+    """Grava o buffer deste worker; retorna quantos tópicos foram atualizados"""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, Counter()
+    if not pending:
+        return 0
+    topic_table = ForumTopic.__table__
+    statement = topic_table.update().where(topic_table.c.id == db.bindparam('topic_id')).values(
+        views_count=db.func.coalesce(topic_table.c.views_count, 0) + db.bindparam('views')
+    )
+    try:
+        db.session.execute(statement, [{'topic_id': topic_id, 'views': views} for topic_id, views in pending.items()])
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        # Devolve ao buffer para a próxima tentativa
+        with _lock:
+            _pending.update(pending)
+        raise
+    return len(pending)
+
+def _flush_loop(app):
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _flush_in_context(app)
+
+def _flush_in_context(app):
+    with app.app_context():
+        try:
+            flush_views()
+        except SQLAlchemyError:
+            logger.exception('Could not flush forum view counts')
+
+def _start_flusher(app):
+    # Iniciada na primeira visualização: depois do fork dos workers do gunicorn
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, args=(app,), name='forum-view-flusher', daemon=True)
+        _flusher.start()
+        atexit.register(_flush_in_context, app)
@@ -0,0 +1,345 @@
+"""Importação e exportação de arquivos GEDCOM (5.5.1 e 7) da tabela person.
+
+Na importação o arquivo é lido como stream, registro a registro, sem nunca ser
+carregado por inteiro. Os registros INDI viram linhas de Person inseridas em
+lotes grandes; os registros FAM guardam apenas as referências (xrefs) de pai,
+mãe e filhos, que são resolvidas numa segunda passagem com um mapa xref -> id.
+
+Na exportação as pessoas são lidas em lotes no servidor e os registros FAM são
+sintetizados a partir dos pares (father_id, mother_id), gerando o arquivo em
+pedaços para uma resposta HTTP em streaming.
+"""
+import re
+import time
+from datetime import datetime
+from src.database import db
+from src.models.person import Person
+from src.models.family_tree import bump_tree_version
+from src.services.person_graph import invalidate_person_graph
+from src.services.ancestry import refresh_ancestry
+from src.services.names import normalize_name
+from src.services.dates import BR_DATE_RE, ISO_DATE_RE, life_date_columns
+from src.services.places import place_columns
+from src.services.family_stats import person_stat_counts, update_family_stats
+
+IMPORT_BATCH_SIZE = 5000
+EXPORT_BATCH_SIZE = 1000
+
+MONTHS = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12,
+}
+MONTH_NAMES = {number: name for name, number in MONTHS.items()}
+DATE_QUALIFIERS = {'ABT', 'CAL', 'EST', 'BEF', 'AFT', 'BET', 'FROM', 'TO', 'INT'}
+
+def iter_records(lines):
+    """Agrupa as linhas do arquivo em registros de nível 0.
+
+    Gera tuplas (tag, xref, linhas), onde ``linhas`` é a lista de
+    (nível, tag, valor) das linhas subordinadas ao registro.
+    """
+    tag = xref = None
+    body = []
+    for raw in lines:
+        # Linha GEDCOM: nível [@xref@] tag [valor]
+        level, _, rest = raw.lstrip('\ufeff \t').rstrip('\r\n').partition(' ')
+        if not level.isdigit():
+            continue
+        line_xref = None
+        if rest.startswith('@'):
+            line_xref, _, rest = rest.partition(' ')
+        line_tag, _, value = rest.partition(' ')
+        if level == '0':
+            if tag is not None:
+                yield tag, xref, body
+            tag, xref, body = line_tag.upper(), line_xref, []
+        elif tag is not None:
+            body.append((int(level), line_tag.upper(), value))
+    if tag is not None:
+        yield tag, xref, body
+
+def parse_date(value):
+    """Converte uma data GEDCOM ("12 MAR 1871", "ABT 1871", "MAR 1871") em ISO parcial.
+
+    Retorna "AAAA-MM-DD", "AAAA-MM" ou "AAAA"; para intervalos usa a primeira data.
+    Datas que não podem ser interpretadas retornam None.
+    """
+    tokens = [t for t in re.sub(r'@#D[^@]*@', ' ', value).upper().split() if t not in DATE_QUALIFIERS]
+    if 'AND' in tokens:
+        tokens = tokens[:tokens.index('AND')]
+    if not tokens or not tokens[-1].isdigit():
+        return None
+    year = int(tokens[-1])
+    month = MONTHS.get(tokens[-2]) if len(tokens) >= 2 else None
+    if month is None:
+        return f'{year:04d}'
+    day = tokens[-3] if len(tokens) >= 3 and tokens[-3].isdigit() else None
+    if day is None:
+        return f'{year:04d}-{month:02d}'
+    return f'{year:04d}-{month:02d}-{int(day):02d}'
+
+def parse_name(value):
+    """Converte "Giovanni /Baroni/" em "Giovanni Baroni"."""
+    return ' '.join(value.replace('/', ' ').split())
+
+def person_from_record(body):
+    """Monta o dicionário de colunas de Person a partir das linhas de um INDI"""
+    person = {
+        'name': None, 'birth_date': None, 'birth_place': None, 'death_date': None,
+        'death_place': None, 'gender': None, 'notes': None, 'created_at': datetime.utcnow(),
+    }
+    notes = []
+    event = None
+    for level, tag, value in body:
+        if level == 1:
+            event = tag
+            if tag == 'NAME' and person['name'] is None:
+                person['name'] = parse_name(value)[:100] or None
+            elif tag == 'SEX':
+                sex = value.strip().upper()
+                person['gender'] = sex if sex in ('M', 'F') else None
+            elif tag == 'NOTE' and not value.startswith('@'):
+                notes.append(value)
+        elif level == 2 and event in ('BIRT', 'DEAT'):
+            prefix = 'birth' if event == 'BIRT' else 'death'
+            if tag == 'DATE' and person[f'{prefix}_date'] is None:
+                person[f'{prefix}_date'] = parse_date(value)
+            elif tag == 'PLAC' and person[f'{prefix}_place'] is None:
+                person[f'{prefix}_place'] = value.strip()[:200] or None
+        elif level == 2 and event == 'NOTE' and notes:
+            if tag == 'CONT':
+                notes[-1] += '\n' + value
+            elif tag == 'CONC':
+                notes[-1] += value
+    person['name'] = person['name'] or 'Unknown'
+    person['name_normalized'] = normalize_name(person['name'])
+    person.update(life_date_columns('birth', person['birth_date']))
+    person.update(life_date_columns('death', person['death_date']))
+    person['notes'] = '\n\n'.join(notes) or None
+    return person
+
+def import_gedcom(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Importa um GEDCOM (iterável de linhas de texto) numa única transação.
+
+    Retorna um resumo com as contagens e a vazão da importação.
+    """
+    started = time.perf_counter()
+    
+    # Incrementar a versão primeiro abre a transação de escrita: com o lock do
+    # SQLite em mãos, os ids podem ser reservados a partir do maior id atual e
+    # os INSERTs viram um executemany simples, sem RETURNING linha a linha.
+    bump_tree_version()
+    person_table = Person.__table__
+    next_id = first_id = (db.session.query(db.func.max(Person.id)).scalar() or 0) + 1
+    
+    id_by_xref = {}
+    parents_by_child = {}   # xref do filho -> (xref do pai, xref da mãe)
+    families = 0
+    batch = []
+
+    for tag, xref, body in iter_records(lines):
+        if tag == 'INDI' and xref:
+            person = person_from_record(body)
+            person['id'] = id_by_xref[xref] = next_id
+            next_id += 1
+            batch.append(person)
+            if len(batch) >= batch_size:
+                place_columns(batch)
+                db.session.execute(person_table.insert(), batch)
+                batch = []
+        elif tag == 'FAM':
+            families += 1
+            husband = wife = None
+            children = []
+            for level, sub_tag, value in body:
+                if level != 1:
+                    continue
+                if sub_tag == 'HUSB':
+                    husband = value.strip()
+                elif sub_tag == 'WIFE':
+                    wife = value.strip()
+                elif sub_tag == 'CHIL':
+                    children.append(value.strip())
+            for child in children:
+                # Filhos em mais de uma família (ex.: adoção) ficam com a primeira
+                parents_by_child.setdefault(child, (husband, wife))
+    if batch:
+        place_columns(batch)
+        db.session.execute(person_table.insert(), batch)
+
+    # Segunda passagem: resolve pai/mãe pelos ids recém-gerados
+    links = []
+    for child, (husband, wife) in parents_by_child.items():
+        child_id = id_by_xref.get(child)
+        if child_id is None:
+            continue
+        links.append({
+            'child_id': child_id,
+            'father_id': id_by_xref.get(husband),
+            'mother_id': id_by_xref.get(wife),
+        })
+    link_parents = person_table.update().where(person_table.c.id == db.bindparam('child_id')).values(
+        father_id=db.bindparam('father_id'), mother_id=db.bindparam('mother_id'),
+        row_version=person_table.c.row_version + 1
+    )
+    for start in range(0, len(links), batch_size):
+        db.session.execute(link_parents, links[start:start + batch_size])
+    refresh_ancestry(id_by_xref.values())
+    if id_by_xref:
+        update_family_stats(added=person_stat_counts(min_id=first_id), lineage=True)
+
+    db.session.commit()
+    invalidate_person_graph()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'persons': len(id_by_xref),
+        'families': families,
+        'linked_children': len(links),
+        'elapsed_seconds': round(elapsed, 3),
+        'persons_per_second': round(len(id_by_xref) / elapsed) if elapsed else None,
+    }
+
+# Exportação
+
+GEDCOM_HEADER = (
+    '0 HEAD\n1 SOUR FAMILIABARONI\n1 GEDC\n2 VERS 5.5.1\n2 FORM LINEAGE-LINKED\n1 CHAR UTF-8\n'
+)
+GEDCOM_TRAILER = '0 TRLR\n'
+
+def format_date(value):
+    """Converte "1871-03-12", "1871-03", "1871" ou "12/03/1871" em data GEDCOM.
+
+    Textos que não seguem nenhum desses formatos viram uma "date phrase" entre parênteses.
+    """
+    value = value.strip()
+    match = ISO_DATE_RE.match(value)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = BR_DATE_RE.match(value)
+        if not match:
+            return f'({value})'
+        day, month, year = match.groups()
+    parts = []
+    if month and 1 <= int(month) <= 12:
+        if day:
+            parts.append(str(int(day)))
+        parts.append(MONTH_NAMES[int(month)])
+    parts.append(year)
+    return ' '.join(parts)
+
+def format_name(name):
+    """Converte "Giovanni Baroni" em "Giovanni /Baroni/" (último nome como sobrenome)"""
+    given, _, surname = name.strip().rpartition(' ')
+    return f'{given} /{surname}/' if given else surname
+
+def family_xref(father_id, mother_id):
+    return f'@F{father_id or 0}_{mother_id or 0}@'
+
+def spouse_families(family_keys):
+    """{id da pessoa: [xref das famílias em que é HUSB/WIFE]} a partir dos pares (father_id, mother_id)"""
+    families = {}
+    for father_id, mother_id in family_keys:
+        for parent_id in (father_id, mother_id):
+            if parent_id:
+                families.setdefault(parent_id, []).append(family_xref(father_id, mother_id))
+    return families
+
+def individual_record(person, with_family=True, families_as_spouse=()):
+    """Linhas GEDCOM de um INDI a partir de uma linha de Person.dict_select()
+
+    ``families_as_spouse`` são os xrefs das famílias que a pessoa encabeça (FAMS),
+    exigidos pelo formato lineage-linked junto com o HUSB/WIFE da família.
+    """
+    lines = [f"0 @I{person.id}@ INDI", f"1 NAME {format_name(person.name)}"]
+    if person.gender in ('M', 'F'):
+        lines.append(f'1 SEX {person.gender}')
+    for tag, date, place in (('BIRT', person.birth_date, person.birth_place),
+                             ('DEAT', person.death_date, person.death_place)):
+        if date or place:
+            lines.append(f'1 {tag}')
+            if date:
+                lines.append(f'2 DATE {format_date(date)}')
+            if place:
+                lines.append(f'2 PLAC {place}')
+    if person.notes:
+        first, *rest = person.notes.splitlines() or ['']
+        lines.append(f'1 NOTE {first}')
+        lines.extend(f'2 CONT {line}' for line in rest)
+    if with_family and (person.father_id or person.mother_id):
+        lines.append(f'1 FAMC {family_xref(person.father_id, person.mother_id)}')
+    lines.extend(f'1 FAMS {xref}' for xref in families_as_spouse)
+    return '\n'.join(lines) + '\n'
+
+def family_record(father_id, mother_id, child_ids):
+    lines = [f'0 {family_xref(father_id, mother_id)} FAM']
+    if father_id:
+        lines.append(f'1 HUSB @I{father_id}@')
+    if mother_id:
+        lines.append(f'1 WIFE @I{mother_id}@')
+    lines.extend(f'1 CHIL @I{child_id}@' for child_id in sorted(child_ids))
+    return '\n'.join(lines) + '\n'
+
+def export_tree(batch_size=EXPORT_BATCH_SIZE):
+    """Gera o GEDCOM da árvore inteira em pedaços de ``batch_size`` registros"""
+    yield GEDCOM_HEADER
+    
+    # Uma única consulta agrupada sintetiza todas as famílias; lida antes dos INDI
+    # porque eles precisam do FAMS de cada família que encabeçam
+    children = db.func.group_concat(Person.id)
+    families = db.session.execute(
+        db.select(Person.father_id, Person.mother_id, children)
+        .where((Person.father_id.isnot(None)) | (Person.mother_id.isnot(None)))
+        .group_by(Person.father_id, Person.mother_id)
+    ).all()
+    as_spouse = spouse_families((father_id, mother_id) for father_id, mother_id, _ in families)
+    
+    query = Person.dict_select().order_by(Person.id).execution_options(yield_per=batch_size)
+    for partition in db.session.execute(query).partitions():
+        yield ''.join(individual_record(person, families_as_spouse=as_spouse.get(person.id, ()))
+                      for person in partition)
+    
+    for start in range(0, len(families), batch_size):
+        yield ''.join(
+            family_record(father_id, mother_id, [int(child_id) for child_id in child_ids.split(',')])
+            for father_id, mother_id, child_ids in families[start:start + batch_size]
+        )
+    
+    yield GEDCOM_TRAILER
+
+def export_subtree(graph, root_id, max_depth=None, batch_size=EXPORT_BATCH_SIZE):
+    """Gera o GEDCOM dos descendentes de ``root_id`` (e seus cônjuges) até ``max_depth`` gerações.
+
+    A seleção é feita no índice PersonGraph; as linhas são lidas em lotes por id.
+    """
+    descendants = {root_id}
+    descendants.update(person_id for person_id, _ in graph.descendants(root_id, max_depth))
+    
+    # Famílias dos descendentes (exceto a da raiz); o outro genitor entra como cônjuge
+    families = {}
+    for person_id in descendants:
+        if person_id == root_id:
+            continue
+        families.setdefault(graph.parents(person_id), []).append(person_id)
+    members = set(descendants)
+    for father_id, mother_id in families:
+        members.update(parent_id for parent_id in (father_id, mother_id) if parent_id is not None)
+    as_spouse = spouse_families(sorted(families, key=lambda key: (key[0] or 0, key[1] or 0)))
+    
+    yield GEDCOM_HEADER
+    
+    member_ids = sorted(members)
+    for start in range(0, len(member_ids), batch_size):
+        chunk = member_ids[start:start + batch_size]
+        rows = db.session.execute(Person.dict_select().where(Person.id.in_(chunk)).order_by(Person.id))
+        yield ''.join(individual_record(person, with_family=person.id in descendants and person.id != root_id,
+                                        families_as_spouse=as_spouse.get(person.id, ()))
+                      for person in rows)
+    
+    items = sorted(families.items(), key=lambda item: (item[0][0] or 0, item[0][1] or 0))
+    for start in range(0, len(items), batch_size):
+        yield ''.join(family_record(father_id, mother_id, child_ids)
+                      for (father_id, mother_id), child_ids in items[start:start + batch_size])
+    
+    yield GEDCOM_TRAILER
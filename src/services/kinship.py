@@ -0,0 +1,124 @@
+"""Cálculo de parentesco entre duas pessoas a partir da tabela ``person_ancestry``.
+
+A tabela de fechamento já guarda, pré-calculado, o mapa {ancestral: distância}
+de cada pessoa: os dois mapas saem de uma única leitura pelo índice
+``ix_person_ancestry_descendant``, sem travessia nem aquecimento de cache. Os
+ancestrais comuns mais próximos (LCAs no DAG da árvore) são os comuns de menor
+soma de distâncias. Daí saem o grau de primo, a remoção e se o parentesco é
+completo ou "meio" (os dois ramos descem de filhos com pai e mãe cadastrados
+que têm só um deles em comum).
+"""
+from src.database import db
+from src.models.person import Person, PersonAncestry
+
+GENDERED_TERMS = {
+    'parent': ('father', 'mother', 'parent'),
+    'child': ('son', 'daughter', 'child'),
+    'sibling': ('brother', 'sister', 'sibling'),
+    'pibling': ('uncle', 'aunt', 'uncle/aunt'),
+    'nibling': ('nephew', 'niece', 'nephew/niece'),
+}
+
+def _ordinal(n):
+    if 10 <= n % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f'{n}{suffix}'
+
+def _term(kind, gender):
+    male, female, neutral = GENDERED_TERMS[kind]
+    return {'M': male, 'F': female}.get(gender, neutral)
+
+def _greats(term, count, prefix='grand'):
+    """parent -> grandparent -> great-grandparent -> great-great-grandparent -> 3x great-grandparent"""
+    if count <= 0:
+        return term
+    greats = count - 1
+    if greats <= 2:
+        return 'great-' * greats + prefix + term
+    return f'{greats}x great-{prefix}{term}'
+
+def describe(distance_a, distance_b, half=False, gender=None):
+    """Descreve o que A é de B, dadas as distâncias de cada um ao ancestral comum"""
+    if distance_a == 0 and distance_b == 0:
+        return 'self', 'self'
+    if distance_a == 0:
+        return 'ancestor', _greats(_term('parent', gender), distance_b - 1)
+    if distance_b == 0:
+        return 'descendant', _greats(_term('child', gender), distance_a - 1)
+
+    prefix = 'half ' if half else ''
+    if distance_a == 1 and distance_b == 1:
+        return 'sibling', prefix + _term('sibling', gender)
+    if distance_a == 1:
+        return 'pibling', prefix + _greats(_term('pibling', gender), distance_b - 2, prefix='great-')
+    if distance_b == 1:
+        return 'nibling', prefix + _greats(_term('nibling', gender), distance_a - 2, prefix='grand')
+
+    degree = min(distance_a, distance_b) - 1
+    removal = abs(distance_a - distance_b)
+    label = f'{prefix}{_ordinal(degree)} cousin'
+    if removal:
+        label += ' once removed' if removal == 1 else f' {removal}x removed'
+    return 'cousin', label
+
+def _ancestor_maps(person_ids):
+    # {pessoa: {ancestral: distância}}, incluindo a própria pessoa a distância 0
+    maps = {person_id: {person_id: 0} for person_id in person_ids}
+    for descendant_id, ancestor_id, distance in db.session.execute(
+        db.select(PersonAncestry.descendant_id, PersonAncestry.ancestor_id, PersonAncestry.distance)
+        .where(PersonAncestry.descendant_id.in_(list(maps)))
+    ):
+        maps[descendant_id][ancestor_id] = distance
+    return maps
+
+def _is_half(ancestor_id, ancestors_a, distance_a, ancestors_b, distance_b):
+    """Meio parentesco: os filhos de ``ancestor_id`` em cada ramo têm pai e mãe cadastrados
+    (um só em comum, já que o outro não é ancestral comum). Com um dos pais
+    desconhecido não dá para afirmar que o parentesco é "meio"."""
+    candidates = {node for node, distance in ancestors_a.items() if distance == distance_a - 1}
+    candidates |= {node for node, distance in ancestors_b.items() if distance == distance_b - 1}
+    parents = {row.id: (row.father_id, row.mother_id) for row in db.session.execute(
+        db.select(Person.id, Person.father_id, Person.mother_id).where(Person.id.in_(candidates))
+    )}
+
+    def branch(ancestors, distance):
+        # Filho do ancestral comum no caminho até a pessoa (o de menor id, se houver vários)
+        children = sorted(node for node, node_distance in ancestors.items()
+                          if node_distance == distance - 1 and ancestor_id in parents.get(node, ()))
+        return parents[children[0]] if children else (None, None)
+
+    return all(None not in branch(ancestors, distance)
+               for ancestors, distance in ((ancestors_a, distance_a), (ancestors_b, distance_b)))
+
+def find_kinship(person_a_id, person_b_id):
+    """Retorna o parentesco de A em relação a B, ou None se não há ancestral comum.
+
+    O resultado traz as distâncias de cada pessoa até os ancestrais comuns mais
+    próximos, o grau de primo, a remoção, se é "meio" parentesco e os ids
+    desses ancestrais.
+    """
+    maps = _ancestor_maps({person_a_id, person_b_id})
+    ancestors_a, ancestors_b = maps[person_a_id], maps[person_b_id]
+    common = ancestors_a.keys() & ancestors_b.keys()
+    if not common:
+        return None
+
+    # O comum de menor soma de distâncias não tem filho comum (o filho teria soma menor):
+    # é um ancestral comum mais próximo, assim como os demais com as mesmas distâncias
+    best = min(common, key=lambda node: (ancestors_a[node] + ancestors_b[node],
+                                         abs(ancestors_a[node] - ancestors_b[node]), node))
+    distance_a, distance_b = ancestors_a[best], ancestors_b[best]
+    closest = sorted(node for node in common if (ancestors_a[node], ancestors_b[node]) == (distance_a, distance_b))
+    half = (min(distance_a, distance_b) > 0 and len(closest) == 1
+            and _is_half(best, ancestors_a, distance_a, ancestors_b, distance_b))
+
+    return {
+        'distance_a': distance_a,
+        'distance_b': distance_b,
+        'degree': max(min(distance_a, distance_b) - 1, 0),
+        'removal': abs(distance_a - distance_b),
+        'half': half,
+        'common_ancestor_ids': closest,
+    }
@@ -0,0 +1,66 @@
+"""Normalização de nomes e código fonético para nomes italianos/portugueses."""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+NON_LETTERS_RE = re.compile(r'[^a-z ]+')
+
+# Regras aplicadas em ordem sobre o texto já sem acentos e em minúsculas
+PHONETIC_RULES = [
+    (re.compile(r'gli'), 'li'),          # guglielmo -> gulielmo
+    (re.compile(r'gn'), 'n'),            # Magnani
+    (re.compile(r'nh'), 'n'),            # Carvalhinho
+    (re.compile(r'lh'), 'l'),            # Coelho
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'sc(?=[ei])'), 'x'),    # Scemi (it.) ~ Xavier
+    (re.compile(r'ch(?=[aou])'), 'x'),   # Chaves (pt.)
+    (re.compile(r'ch'), 'k'),            # Chiara, Marchetti (it.)
+    (re.compile(r'c(?=[ei])'), 's'),     # Cecilia, Vicente
+    (re.compile(r'qu|c|q'), 'k'),
+    (re.compile(r'g(?=[ei])'), 'j'),     # Giovanni ~ Jovani
+    (re.compile(r'gu(?=[ei])'), 'g'),    # Guerra
+    (re.compile(r'z'), 's'),
+    (re.compile(r'y'), 'i'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'(.)\1+'), r'\1'),      # Giovanni -> Giovani, Rossi -> Rosi
+]
+VOWELS_RE = re.compile(r'[aeiou]')
+
+def strip_accents(text):
+    """Remove acentos e cedilhas: "João Conceição" vira "Joao Conceicao"."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def normalize_name(name):
+    """Minúsculas, sem acentos, sem pontuação e com espaços simples"""
+    if not name:
+        return ''
+    return ' '.join(NON_LETTERS_RE.sub(' ', strip_accents(name).lower()).split())
+
+def phonetic_key(word):
+    """Código fonético de uma palavra: primeira letra + esqueleto de consoantes.
+
+    Pensado para variações de grafia comuns em registros italianos e
+    portugueses ("Giovanni"/"Giovani", "Baroni"/"Barone", "Coelho"/"Coelo").
+    """
+    word = normalize_name(word.lower().replace('ç', 's')).replace(' ', '')
+    if not word:
+        return ''
+    for pattern, replacement in PHONETIC_RULES:
+        word = pattern.sub(replacement, word)
+    if not word:
+        return ''
+    return word[0] + VOWELS_RE.sub('', word[1:])
+
+def name_similarity(declared, name):
+    """Similaridade (0 a 1) entre um nome declarado e um nome cadastrado, ambos normalizados.
+
+    Um nome declarado de uma palavra só ("Giuseppe") é comparado com o primeiro
+    nome da pessoa.
+    """
+    if not declared or not name:
+        return 0.0
+    if ' ' not in declared:
+        name = name.split()[0]
+    return SequenceMatcher(None, declared, name).ratio()
@@ -0,0 +1,200 @@
+"""Criação e atualização de pessoas em lote, numa única transação.
+
+Cada item do lote é ``{"op": "create", "temp_id": ..., <campos>}`` ou
+``{"op": "update", "id": ..., <campos>}``. Em ``father_id``/``mother_id`` um
+valor string referencia o ``temp_id`` de uma pessoa criada no mesmo lote, o que
+permite cadastrar pais e filhos novos de uma vez.
+
+O lote é validado por inteiro antes de qualquer escrita: se algum item for
+inválido nada é gravado. As escritas usam executemany (um INSERT para todas as
+criações e um UPDATE por conjunto de campos alterados).
+"""
+from datetime import datetime
+from src.database import db
+from src.models.person import Person
+from src.models.family_tree import bump_tree_version
+from src.services.person_graph import get_person_graph, record_links
+from src.services.ancestry import refresh_ancestry
+from src.services.names import normalize_name
+from src.services.dates import life_date_columns
+from src.services.places import place_columns
+from src.services.family_stats import person_stat_counts, update_family_stats
+
+BATCH_MAX_ITEMS = 500
+PERSON_FIELDS = (
+    'name', 'birth_date', 'birth_place', 'death_date', 'death_place',
+    'gender', 'notes', 'father_id', 'mother_id',
+)
+LINK_FIELDS = ('father_id', 'mother_id')
+
+class BatchError(ValueError):
+    pass
+
+def _valid_name(value):
+    return isinstance(value, str) and bool(value.strip())
+
+def _validate(items, graph, existing_ids):
+    """Retorna a lista de erros por item (None quando o item é válido)"""
+    temp_ids = {}
+    update_ids = set()
+    errors = [None] * len(items)
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or item.get('op') not in ('create', 'update'):
+            errors[index] = "op must be 'create' or 'update'"
+        elif item['op'] == 'create':
+            temp_id = item.get('temp_id')
+            if not _valid_name(item.get('name')):
+                errors[index] = 'name is required'
+            elif temp_id is not None and (not isinstance(temp_id, str) or temp_id in temp_ids):
+                errors[index] = 'temp_id must be a unique string'
+            elif temp_id is not None:
+                temp_ids[temp_id] = index
+        elif item.get('id') not in existing_ids:
+            errors[index] = 'Person not found'
+        elif item['id'] in update_ids:
+            # Os vínculos e a checagem de ciclos partem do estado anterior ao lote
+            errors[index] = 'A person can be updated only once per batch'
+        elif 'name' in item and not _valid_name(item['name']):
+            errors[index] = 'name must be a non-empty string'
+        else:
+            update_ids.add(item['id'])
+
+    for index, item in enumerate(items):
+        if errors[index]:
+            continue
+        for field in LINK_FIELDS:
+            value = item.get(field)
+            if value is None:
+                continue
+            if isinstance(value, str):
+                if value not in temp_ids:
+                    errors[index] = f'{field} references unknown temp_id {value!r}'
+            elif not isinstance(value, int) or value not in graph:
+                errors[index] = f'{field} references unknown person {value!r}'
+
+    # Ciclos: caminha pelos pais considerando as alterações do próprio lote
+    overlay = {}
+    for index, item in enumerate(items):
+        if errors[index]:
+            continue
+        key = item['id'] if item['op'] == 'update' else ('new', index)
+        current = graph.parents(key) if item['op'] == 'update' else (None, None)
+        links = []
+        for field, old in zip(LINK_FIELDS, current):
+            value = item.get(field, old) if item['op'] == 'update' else item.get(field)
+            links.append(('new', temp_ids[value]) if isinstance(value, str) else value)
+        overlay[key] = (index, links)
+
+    def parents_of(key):
+        if key in overlay:
+            return overlay[key][1]
+        if isinstance(key, int) and key in graph:
+            return graph.parents(key)
+        return ()
+
+    for key, (index, _) in overlay.items():
+        seen = set()
+        stack = [parent for parent in parents_of(key) if parent is not None]
+        while stack:
+            other = stack.pop()
+            if other == key:
+                errors[index] = 'Invalid parent: would create a cycle'
+                break
+            if other in seen:
+                continue
+            seen.add(other)
+            stack.extend(parent for parent in parents_of(other) if parent is not None)
+    return errors
+
+def apply_person_batch(items):
+    """Valida e aplica o lote; retorna a lista de resultados por item.
+
+    Lança ``BatchError`` (com os resultados em ``args[1]``) se algum item for inválido.
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchError('items must be a non-empty list', [])
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchError(f'A batch accepts at most {BATCH_MAX_ITEMS} items', [])
+
+    graph = get_person_graph()
+    update_ids = [item.get('id') for item in items if isinstance(item, dict) and item.get('op') == 'update']
+    existing_ids = {person_id for person_id in update_ids if isinstance(person_id, int) and person_id in graph}
+    errors = _validate(items, graph, existing_ids)
+    if any(errors):
+        results = [{'index': index, 'status': 'error' if error else 'skipped', 'message': error}
+                   for index, error in enumerate(errors)]
+        raise BatchError('Invalid batch', results)
+
+    # A versão é incrementada antes de tudo para abrir a transação de escrita;
+    # com o lock em mãos os ids das novas pessoas são reservados a partir do maior id
+    version = bump_tree_version()
+    stats_before = person_stat_counts(existing_ids)
+    next_id = (db.session.query(db.func.max(Person.id)).scalar() or 0) + 1
+    id_by_temp = {}
+    new_ids = {}
+    for index, item in enumerate(items):
+        if item['op'] == 'create':
+            new_ids[index] = next_id
+            if item.get('temp_id') is not None:
+                id_by_temp[item['temp_id']] = next_id
+            next_id += 1
+
+    def resolve(value):
+        return id_by_temp[value] if isinstance(value, str) else value
+
+    person_table = Person.__table__
+    now = datetime.utcnow()
+    inserts = []
+    updates = {}   # campos alterados -> lista de parâmetros
+    links = []
+    results = []
+    item_values = []
+    for item in items:
+        values = {field: item[field] for field in PERSON_FIELDS if field in item}
+        for field in LINK_FIELDS:
+            if field in values:
+                values[field] = resolve(values[field])
+        if 'name' in values:
+            values['name_normalized'] = normalize_name(values['name'])
+        for prefix in ('birth', 'death'):
+            if f'{prefix}_date' in values:
+                values.update(life_date_columns(prefix, values[f'{prefix}_date']))
+        item_values.append(values)
+    place_columns(item_values)
+    
+    for index, (item, values) in enumerate(zip(items, item_values)):
+        if item['op'] == 'create':
+            row = dict.fromkeys(PERSON_FIELDS)
+            row.update(life_date_columns('birth', None), **life_date_columns('death', None))
+            row.update(birth_place_id=None, death_place_id=None)
+            row.update(values, id=new_ids[index], created_at=now)
+            inserts.append(row)
+            links.append((row['id'], row['father_id'], row['mother_id']))
+            results.append({'index': index, 'status': 'created', 'id': row['id'], 'temp_id': item.get('temp_id')})
+        else:
+            person_id = item['id']
+            if values:
+                updates.setdefault(tuple(sorted(values)), []).append(dict(values, _id=person_id))
+            if any(field in values for field in LINK_FIELDS):
+                father_id, mother_id = graph.parents(person_id)
+                links.append((person_id, values.get('father_id', father_id), values.get('mother_id', mother_id)))
+            results.append({'index': index, 'status': 'updated', 'id': person_id})
+
+    if inserts:
+        db.session.execute(person_table.insert(), inserts)
+    for fields, params in updates.items():
+        statement = (
+            person_table.update()
+            .where(person_table.c.id == db.bindparam('_id'))
+            .values({field: db.bindparam(field) for field in fields})
+            .values(row_version=person_table.c.row_version + 1)
+        )
+        db.session.execute(statement, params)
+    refresh_ancestry(person_id for person_id, _, _ in links)
+    update_family_stats(
+        removed=stats_before, added=person_stat_counts([*existing_ids, *new_ids.values()]), lineage=bool(links)
+    )
+
+    db.session.commit()
+    record_links(links, version)
+    return results
@@ -0,0 +1,159 @@
+"""Índice de adjacência pai/filho da árvore genealógica mantido em memória.
+
+Cada worker carrega uma única vez as tuplas (id, father_id, mother_id) e passa
+a responder travessias sem consultar o ORM. Os ids são mapeados para inteiros
+densos e os pais ficam em arrays paralelos. As rotas de escrita aplicam suas
+alterações de forma incremental; os demais workers percebem a mudança pelo
+contador em ``TreeVersion`` e recarregam o índice na próxima leitura.
+"""
+import threading
+from array import array
+from collections import deque
+from src.database import db
+from src.models.person import Person
+from src.models.family_tree import current_tree_version
+
+NO_PARENT = -1
+
+class PersonGraph:
+    def __init__(self, version=0):
+        self.version = version
+        self.ids = array('q')        # índice denso -> id da pessoa
+        self.index = {}              # id da pessoa -> índice denso
+        self.fathers = array('q')    # índice denso -> índice denso do pai ou NO_PARENT
+        self.mothers = array('q')    # índice denso -> índice denso da mãe ou NO_PARENT
+        self.children = []           # índice denso -> lista de índices densos dos filhos
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, person_id):
+        return person_id in self.index
+
+    @classmethod
+    def load(cls, version):
+        """Monta o índice com uma única consulta sobre a tabela person"""
+        graph = cls(version)
+        rows = db.session.query(Person.id, Person.father_id, Person.mother_id).order_by(Person.id).all()
+        for person_id, _, _ in rows:
+            graph._slot(person_id)
+        for person_id, father_id, mother_id in rows:
+            graph._link(graph.index[person_id], father_id, mother_id)
+        return graph
+
+    def _slot(self, person_id):
+        node = self.index.get(person_id)
+        if node is None:
+            node = len(self.ids)
+            self.index[person_id] = node
+            self.ids.append(person_id)
+            self.fathers.append(NO_PARENT)
+            self.mothers.append(NO_PARENT)
+            self.children.append([])
+        return node
+
+    def _link(self, node, father_id, mother_id):
+        # Pais que não existem no índice (ids órfãos) e auto-referências são ignorados
+        father = self.index.get(father_id, NO_PARENT) if father_id is not None else NO_PARENT
+        mother = self.index.get(mother_id, NO_PARENT) if mother_id is not None else NO_PARENT
+        if father == node:
+            father = NO_PARENT
+        if mother == node:
+            mother = NO_PARENT
+        self.fathers[node] = father
+        self.mothers[node] = mother
+        for parent in {father, mother}:
+            if parent != NO_PARENT:
+                self.children[parent].append(node)
+
+    def _unlink(self, node):
+        for parent in {self.fathers[node], self.mothers[node]}:
+            if parent != NO_PARENT:
+                self.children[parent].remove(node)
+        self.fathers[node] = NO_PARENT
+        self.mothers[node] = NO_PARENT
+
+    def set_parents(self, person_id, father_id, mother_id):
+        """Registra (ou substitui) os pais de uma pessoa"""
+        node = self._slot(person_id)
+        self._unlink(node)
+        self._link(node, father_id, mother_id)
+
+    def _parent_nodes(self, node):
+        father, mother = self.fathers[node], self.mothers[node]
+        if father != NO_PARENT:
+            yield father
+        if mother != NO_PARENT and mother != father:
+            yield mother
+
+    def parents(self, person_id):
+        """Retorna (father_id, mother_id) conforme o índice"""
+        node = self.index[person_id]
+        father, mother = self.fathers[node], self.mothers[node]
+        return (self.ids[father] if father != NO_PARENT else None,
+                self.ids[mother] if mother != NO_PARENT else None)
+
+    def children_of(self, person_id):
+        return [self.ids[child] for child in self.children[self.index[person_id]]]
+
+    def _walk(self, start, neighbours, max_depth=None):
+        """Busca em largura a partir de um nó; cada nó aparece uma vez, na menor distância"""
+        seen = {start}
+        queue = deque([(start, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for other in neighbours(node):
+                if other not in seen:
+                    seen.add(other)
+                    queue.append((other, depth + 1))
+                    yield other, depth + 1
+
+    def descendants(self, person_id, max_depth=None):
+        """Gera (id, distância) de cada descendente, do mais próximo ao mais distante"""
+        for node, depth in self._walk(self.index[person_id], self.children.__getitem__, max_depth):
+            yield self.ids[node], depth
+
+_graph = None
+_lock = threading.Lock()
+
+def get_person_graph():
+    """Retorna o índice deste worker, recarregando-o se a árvore mudou em outro processo"""
+    global _graph
+    version = current_tree_version()
+    with _lock:
+        if _graph is None or _graph.version != version:
+            _graph = PersonGraph.load(version)
+        return _graph
+
+def record_person_links(person_id, father_id, mother_id, version):
+    """Aplica ao índice uma escrita já confirmada no banco.
+
+    ``version`` é o valor devolvido por ``bump_tree_version`` na mesma transação.
+    Se outra escrita aconteceu no meio (em outro worker), o índice é descartado
+    e recarregado na próxima leitura.
+    """
+    record_links([(person_id, father_id, mother_id)], version)
+
+def record_links(links, version):
+    """Como ``record_person_links``, para várias tuplas (id, father_id, mother_id) de uma transação"""
+    global _graph
+    with _lock:
+        if _graph is None:
+            return
+        if _graph.version != version - 1:
+            _graph = None
+            return
+        # Pessoas novas primeiro, para que pais criados no mesmo lote já existam no índice
+        for person_id, _, _ in links:
+            _graph._slot(person_id)
+        for person_id, father_id, mother_id in links:
+            _graph.set_parents(person_id, father_id, mother_id)
+        _graph.version = version
+
+def invalidate_person_graph():
+    """Descarta o índice deste worker (ex.: após importações em lote)"""
+    global _graph
+    with _lock:
+        _graph = None
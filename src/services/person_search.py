@@ -0,0 +1,130 @@
+"""Busca de pessoas por nome, sem acentos e tolerante a erros de digitação.
+
+``Person.name_normalized`` guarda o nome em minúsculas e sem acentos
+(``src.services.names.normalize_name``) e é indexado pela tabela FTS5
+``person_name_fts`` com o tokenizador ``trigram``. A tabela usa ``person``
+como conteúdo externo e é mantida por triggers, então toda escrita (ORM,
+importação GEDCOM, lote) atualiza o índice sem código extra.
+
+Primeiro cada palavra da consulta é procurada como substring (sem ordenar por
+relevância, o que para cedo mesmo em sobrenomes muito comuns). Se isso não
+preencher o limite, a consulta é quebrada em trigramas combinados com OR: um
+nome com uma letra trocada ainda compartilha a maioria dos trigramas, e os
+melhores candidatos pelo BM25 entram na lista. No fim os candidatos são
+reordenados pela similaridade com o nome completo.
+"""
+from difflib import SequenceMatcher
+from src.database import db
+from src.models.person import Person
+from src.services.names import normalize_name
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+CANDIDATES_PER_RESULT = 10
+
+SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS person_name_fts USING fts5("
+    "name_normalized, content='person', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS person_name_fts_ai AFTER INSERT ON person BEGIN "
+    "INSERT INTO person_name_fts(rowid, name_normalized) VALUES (new.id, new.name_normalized); END",
+    "CREATE TRIGGER IF NOT EXISTS person_name_fts_ad AFTER DELETE ON person BEGIN "
+    "INSERT INTO person_name_fts(person_name_fts, rowid, name_normalized) "
+    "VALUES ('delete', old.id, old.name_normalized); END",
+    "CREATE TRIGGER IF NOT EXISTS person_name_fts_au AFTER UPDATE OF name_normalized ON person BEGIN "
+    "INSERT INTO person_name_fts(person_name_fts, rowid, name_normalized) "
+    "VALUES ('delete', old.id, old.name_normalized); "
+    "INSERT INTO person_name_fts(rowid, name_normalized) VALUES (new.id, new.name_normalized); END",
+)
+
+def _fill_normalized_names():
+    person_table = Person.__table__
+    rows = db.session.execute(
+        db.select(person_table.c.id, person_table.c.name).where(person_table.c.name_normalized.is_(None))
+    ).all()
+    if rows:
+        statement = person_table.update().where(person_table.c.id == db.bindparam('person_id')).values(
+            name_normalized=db.bindparam('normalized')
+        )
+        db.session.execute(statement, [
+            {'person_id': person_id, 'normalized': normalize_name(name)} for person_id, name in rows
+        ])
+    return len(rows)
+
+def _create_search_index():
+    # name_normalized é preenchido antes dos triggers existirem: com o conteúdo
+    # externo, um 'delete' de linha nunca indexada corromperia o índice
+    filled = _fill_normalized_names()
+    connection = db.session.connection()
+    for statement in SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO person_name_fts(person_name_fts) VALUES ('rebuild')")
+    return filled
+
+def ensure_search_index():
+    """Cria e preenche o índice de busca se ainda não existir (bancos anteriores à busca)"""
+    exists = db.session.connection().exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'person_name_fts'"
+    ).first()
+    if not exists:
+        _create_search_index()
+        db.session.commit()
+
+def rebuild_search_index():
+    """Recria o índice de busca a partir de person; retorna quantos nomes foram normalizados"""
+    connection = db.session.connection()
+    for trigger in ('person_name_fts_ai', 'person_name_fts_ad', 'person_name_fts_au'):
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+    connection.exec_driver_sql('DROP TABLE IF EXISTS person_name_fts')
+    return _create_search_index()
+
+def _substring_query(normalized):
+    return ' AND '.join(f'"{word}"' for word in normalized.split() if len(word) >= 3)
+
+def _trigram_query(normalized):
+    trigrams = set()
+    for word in normalized.split():
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return ' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams))
+
+def _similarity(query, name):
+    """Similaridade do nome inteiro, ou da melhor palavra para consultas de uma palavra"""
+    score = SequenceMatcher(None, query, name).ratio()
+    if ' ' not in query:
+        score = max([score] + [SequenceMatcher(None, query, word).ratio() for word in name.split()])
+    if name.startswith(query) or f' {query}' in name:
+        score += 0.5
+    return score
+
+def search_persons(query, limit=SEARCH_DEFAULT_LIMIT):
+    """Retorna até ``limit`` pessoas (to_dict + score), das mais parecidas com ``query`` às menos"""
+    normalized = normalize_name(query)
+    if not normalized:
+        return []
+
+    match = _trigram_query(normalized)
+    if match:
+        candidates = db.session.execute(db.text(
+            'SELECT rowid, name_normalized FROM person_name_fts WHERE person_name_fts MATCH :match LIMIT :candidates'
+        ), {'match': _substring_query(normalized), 'candidates': limit * CANDIDATES_PER_RESULT}).all()
+        if len(candidates) < limit:
+            candidates += db.session.execute(db.text(
+                'SELECT rowid, name_normalized FROM person_name_fts WHERE person_name_fts MATCH :match '
+                'ORDER BY rank LIMIT :candidates'
+            ), {'match': match, 'candidates': limit * CANDIDATES_PER_RESULT}).all()
+    else:
+        # Menos de três letras: não há trigramas, busca por prefixo no índice da coluna
+        candidates = db.session.execute(
+            db.select(Person.id, Person.name_normalized)
+            .where(Person.name_normalized >= normalized, Person.name_normalized < normalized + '\uffff')
+            .order_by(Person.name_normalized).limit(limit)
+        ).all()
+
+    scored = sorted(
+        ((_similarity(normalized, name or ''), person_id) for person_id, name in dict(candidates).items()),
+        key=lambda item: (-item[0], item[1])
+    )[:limit]
+    rows = db.session.execute(
+        Person.dict_select().where(Person.id.in_([person_id for _, person_id in scored]))
+    ).mappings()
+    persons = {row['id']: dict(row) for row in rows}
+    return [dict(persons[person_id], score=round(score, 4)) for score, person_id in scored if person_id in persons]
@@ -0,0 +1,173 @@
+"""Normalização dos locais de nascimento/morte para a tabela ``place``.
+
+O texto livre é quebrado em partes ("Treviso, Itália", "TREVISO - IT"); a
+primeira parte é a localidade e a última, se for um país conhecido, dá o código
+do país. A chave do lugar é a localidade sem acentos e em minúsculas, seguida
+do país quando ele é conhecido ("treviso|it"), de modo que variações de grafia
+do mesmo município apontam para a mesma linha sem juntar cidades homônimas de
+países diferentes (Treviso na Itália e em Santa Catarina).
+
+Coordenadas vêm de um gazetteer offline no formato de cidades do GeoNames
+(``cities500.txt``, ``cities15000.txt``...): TSV com nome, nome ASCII, latitude,
+longitude, código do país e população.
+"""
+import re
+from sqlalchemy.dialects.sqlite import insert
+from src.database import db
+from src.models.person import Person
+from src.models.place import Place
+from src.models.family_tree import bump_tree_version
+from src.services.batching import chunks
+from src.services.names import normalize_name
+
+PLACE_SPLIT_RE = re.compile(r'\s*[,;/]\s*|\s+-\s+')
+UPDATE_BATCH_SIZE = 5000
+
+COUNTRY_ALIASES = {
+    'it': 'IT', 'ita': 'IT', 'italia': 'IT', 'italy': 'IT',
+    'br': 'BR', 'bra': 'BR', 'brasil': 'BR', 'brazil': 'BR',
+    'pt': 'PT', 'portugal': 'PT',
+    'ar': 'AR', 'argentina': 'AR',
+    'uy': 'UY', 'uruguai': 'UY', 'uruguay': 'UY',
+    'es': 'ES', 'espanha': 'ES', 'espana': 'ES', 'spain': 'ES',
+    'de': 'DE', 'alemanha': 'DE', 'germany': 'DE',
+    'us': 'US', 'usa': 'US', 'eua': 'US', 'estados unidos': 'US',
+}
+
+def parse_place(text):
+    """Retorna (chave, nome de exibição, código do país) de um local livre, ou None"""
+    parts = [part for part in PLACE_SPLIT_RE.split((text or '').strip()) if part]
+    if not parts:
+        return None
+    key = normalize_name(parts[0])
+    if not key:
+        return None
+    country_code = COUNTRY_ALIASES.get(normalize_name(parts[-1])) if len(parts) > 1 else None
+    if country_code:
+        key = f'{key}|{country_code.lower()}'
+    name = parts[0].title() if parts[0].isupper() else parts[0]
+    return key, name[:200], country_code
+
+def split_place_key(key):
+    """(localidade, código do país ou None) de uma chave de lugar"""
+    locality, _, country = key.partition('|')
+    return locality, country.upper() or None
+
+def resolve_places(texts):
+    """Mapeia cada texto de local para o id do seu Place, criando os que faltam"""
+    parsed = {}
+    for text in set(texts):
+        place = parse_place(text)
+        if place:
+            parsed[text] = place
+    keys = {key for key, _, _ in parsed.values()}
+
+    ids = {}
+    for chunk in chunks(keys):
+        ids.update(db.session.execute(db.select(Place.key, Place.id).where(Place.key.in_(chunk))).all())
+    missing = {}
+    for key, name, country_code in parsed.values():
+        if key not in ids and key not in missing:
+            missing[key] = {'key': key, 'name': name, 'country_code': country_code}
+    if missing:
+        # Outra transação pode ter criado o mesmo lugar entre a leitura e a escrita
+        statement = insert(Place.__table__).on_conflict_do_nothing(index_elements=['key'])
+        db.session.execute(statement, list(missing.values()))
+        for chunk in chunks(missing):
+            ids.update(db.session.execute(db.select(Place.key, Place.id).where(Place.key.in_(chunk))).all())
+    return {text: ids[key] for text, (key, _, _) in parsed.items()}
+
+def assign_places(person):
+    """Atualiza birth_place_id/death_place_id de uma Person do ORM a partir do texto"""
+    place_ids = resolve_places(text for text in (person.birth_place, person.death_place) if text)
+    person.birth_place_id = place_ids.get(person.birth_place)
+    person.death_place_id = place_ids.get(person.death_place)
+
+def place_columns(rows):
+    """Preenche birth_place_id/death_place_id em dicionários de linha (importação e lote)"""
+    place_ids = resolve_places(
+        row[field] for row in rows for field in ('birth_place', 'death_place') if row.get(field)
+    )
+    for row in rows:
+        for prefix in ('birth', 'death'):
+            if f'{prefix}_place' in row:
+                row[f'{prefix}_place_id'] = place_ids.get(row[f'{prefix}_place'])
+
+def normalize_person_places():
+    """Job em massa: vincula todas as pessoas aos lugares; retorna quantas linhas foram atualizadas"""
+    person_table = Person.__table__
+    rows = db.session.execute(
+        db.select(person_table.c.id, person_table.c.birth_place, person_table.c.death_place,
+                  person_table.c.birth_place_id, person_table.c.death_place_id)
+    ).all()
+    place_ids = resolve_places(text for row in rows for text in (row.birth_place, row.death_place) if text)
+
+    changes = [
+        {'person_id': row.id, 'birth_id': place_ids.get(row.birth_place), 'death_id': place_ids.get(row.death_place)}
+        for row in rows
+        if (place_ids.get(row.birth_place), place_ids.get(row.death_place)) != (row.birth_place_id, row.death_place_id)
+    ]
+    statement = person_table.update().where(person_table.c.id == db.bindparam('person_id')).values(
+        birth_place_id=db.bindparam('birth_id'), death_place_id=db.bindparam('death_id'),
+        row_version=person_table.c.row_version + 1
+    )
+    if changes:
+        bump_tree_version()
+    for start in range(0, len(changes), UPDATE_BATCH_SIZE):
+        db.session.execute(statement, changes[start:start + UPDATE_BATCH_SIZE])
+    return len(changes)
+
+def load_gazetteer(lines):
+    """Carrega nomes canônicos e coordenadas de um arquivo de cidades do GeoNames.
+
+    Só atualiza lugares que já existem. Um lugar com país conhecido só aceita
+    cidades desse país; sem país, fica a cidade mais populosa com o mesmo nome.
+    Retorna quantos lugares receberam coordenadas.
+    """
+    wanted = {}
+    for key in db.session.execute(db.select(Place.key)).scalars():
+        locality, country_code = split_place_key(key)
+        wanted.setdefault(locality, []).append((key, country_code))
+    best = {}
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 15:
+            continue
+        name, ascii_name = fields[1], fields[2]
+        country_code = fields[8][:2].upper() or None
+        population = int(fields[14]) if fields[14].isdigit() else 0
+        for locality in {normalize_name(name), normalize_name(ascii_name)} & wanted.keys():
+            for key, place_country in wanted[locality]:
+                if place_country is not None and place_country != country_code:
+                    continue
+                if key not in best or population > best[key]['population']:
+                    best[key] = {
+                        'place_key': key, 'name': name[:200], 'country_code': country_code,
+                        'latitude': float(fields[4]), 'longitude': float(fields[5]), 'population': population,
+                    }
+
+    place_table = Place.__table__
+    statement = place_table.update().where(place_table.c.key == db.bindparam('place_key')).values(
+        name=db.bindparam('name'), country_code=db.bindparam('country_code'),
+        latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'),
+    )
+    if best:
+        db.session.execute(statement, list(best.values()))
+    return len(best)
+
+def place_stats(limit=None):
+    """Nascimentos e mortes por lugar, pelos índices de birth_place_id/death_place_id"""
+    counts = {}
+    for column, label in ((Person.birth_place_id, 'births'), (Person.death_place_id, 'deaths')):
+        for place_id, count in db.session.execute(
+            db.select(column, db.func.count()).where(column.isnot(None)).group_by(column)
+        ):
+            counts.setdefault(place_id, {'births': 0, 'deaths': 0})[label] = count
+
+    ranked = sorted(counts.items(), key=lambda item: (-(item[1]['births'] + item[1]['deaths']), item[0]))
+    if limit is not None:
+        ranked = ranked[:limit]
+    places = {}
+    for chunk in chunks([place_id for place_id, _ in ranked]):
+        places.update((place.id, place) for place in Place.query.filter(Place.id.in_(chunk)))
+    return [dict(places[place_id].to_dict(), **place_counts) for place_id, place_counts in ranked]